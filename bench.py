@@ -0,0 +1,382 @@
+"""Micro-benchmarks for the bot's hot-path detectors.
+
+Usage: python bench.py [name ...]   (no names runs everything)
+
+The retention benchmark needs a scratch Postgres: set BENCH_DATABASE_URL.
+"""
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import export
+import fingerprint
+import flood
+import impersonation
+import linkscan
+import scamimages
+
+
+def _random_message(rng, words=12):
+    return ' '.join(''.join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9)))
+                    for _ in range(words))
+
+
+def _blast_traffic(detector, messages, guilds, users, channels, now=0.0):
+    rng = random.Random(1)
+    pool = [_random_message(rng, rng.randint(3, 30)) for _ in range(2000)]
+    scam = "FREE NITRO for everyone claim now https://dlscord-gift.com/abc"
+    flagged = 0
+    for i in range(messages):
+        now += 0.001  # 1000 msg/s across all guilds
+        if i % 1000 < 4:
+            content, user = scam, 42
+        else:
+            content, user = rng.choice(pool), rng.randrange(users)
+        if detector.observe(rng.randrange(guilds), user,
+                            rng.randrange(channels), content, now) >= 3:
+            flagged += 1
+    return flagged
+
+
+def bench_fingerprint(messages=200_000, guilds=20, users=5000, channels=30):
+    """Blast detector over synthetic traffic with a scam blast mixed in"""
+    detector = fingerprint.BlastDetector(capacity=2048, window=30.0)
+    start = time.perf_counter()
+    flagged = _blast_traffic(detector, messages, guilds, users, channels)
+    elapsed = time.perf_counter() - start
+    print(f"fingerprint: {messages} msgs in {elapsed:.2f}s "
+          f"({elapsed / messages * 1e6:.1f} us/msg, "
+          f"{messages / elapsed:,.0f} msg/s), flagged {flagged}")
+
+    # Memory must stay flat once every guild's ring is full
+    tracemalloc.start()
+    detector = fingerprint.BlastDetector(capacity=2048, window=30.0)
+    usage = []
+    chunk = messages // 10
+    for i in range(5):
+        _blast_traffic(detector, chunk, guilds, users, channels,
+                       now=i * chunk * 0.001)
+        usage.append(tracemalloc.get_traced_memory()[0] / 1e6)
+    tracemalloc.stop()
+    print("fingerprint: memory after each 10% chunk: " +
+          ", ".join(f"{mb:.1f} MB" for mb in usage))
+
+
+def bench_linkscan(domains=150_000, messages=100_000):
+    """Blocklist trie build size and per-message scan cost"""
+    rng = random.Random(2)
+    tlds = ['com', 'net', 'org', 'gg', 'xyz', 'ru', 'site', 'gift', 'co.uk']
+    blocked = [
+        ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 14))) +
+        '.' + rng.choice(tlds) for _ in range(domains)
+    ]
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    blocklist = linkscan.Blocklist(None)
+    blocklist.trie = linkscan.DomainTrie(linkscan.parse_blocklist(blocked))
+    build = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"linkscan: {blocklist.trie.size} domains loaded in {build:.2f}s, "
+          f"{size / 1e6:.1f} MB (including the source strings)")
+
+    samples = [
+        _random_message(rng),
+        "check out https://github.com/foo/bar and www.example.com",
+        f"FREE NITRO https://claim.{blocked[0]}/gift discord.gg/abc123",
+        "lol no links here at all",
+    ]
+    hits = 0
+    start = time.perf_counter()
+    for i in range(messages):
+        blocked_hits, _ = linkscan.scan_message(samples[i % 4], blocklist)
+        hits += bool(blocked_hits)
+    elapsed = time.perf_counter() - start
+    print(f"linkscan: {messages} msgs in {elapsed:.2f}s "
+          f"({elapsed / messages * 1e6:.1f} us/msg), {hits} blocked")
+
+
+def bench_scamimages(images=100_000, queries=20_000, radius=6):
+    """Hamming-radius lookups over known scam image hashes"""
+    rng = random.Random(3)
+    tree = scamimages.MultiIndexHash()
+    stored = [rng.getrandbits(64) for _ in range(images)]
+    start = time.perf_counter()
+    for value in stored:
+        tree.add(value)
+    build = time.perf_counter() - start
+
+    probes = []
+    for i in range(queries):
+        if i % 2:
+            probes.append(rng.getrandbits(64))  # unknown image
+        else:
+            flip = sum(1 << rng.randrange(64) for _ in range(3))
+            probes.append(rng.choice(stored) ^ flip)  # re-encoded scam image
+    hits = 0
+    start = time.perf_counter()
+    for value in probes:
+        hits += bool(tree.query(value, radius))
+    elapsed = time.perf_counter() - start
+    print(f"scamimages: {tree.size} hashes built in {build:.2f}s, "
+          f"{queries} queries at radius {radius} in {elapsed:.2f}s "
+          f"({elapsed / queries * 1e6:.1f} us/query), {hits} hits")
+
+
+def bench_flood(messages=1_000_000, guilds=100, users=1_000_000):
+    """Token-bucket flood tracker: per-message cost and memory per user"""
+    rng = random.Random(4)
+    tracker = flood.FloodTracker(rate=1.0, burst=8, idle_ttl=600.0)
+    events = [(rng.randrange(guilds), rng.randrange(users))
+              for _ in range(messages)]
+    now = 0.0
+    flagged = 0
+    start = time.perf_counter()
+    for guild_id, user_id in events:
+        now += 0.0002  # 5000 msg/s
+        flagged += tracker.hit(guild_id, user_id, now)
+    elapsed = time.perf_counter() - start
+    print(f"flood: {messages} msgs in {elapsed:.2f}s "
+          f"({elapsed / messages * 1e6:.2f} us/msg), "
+          f"{len(tracker)} tracked, {flagged} flagged")
+
+    start = time.perf_counter()
+    for _ in range(5):
+        tracker.hit(0, 1, now)
+    spammer = sum(tracker.hit(0, 1, now) for _ in range(20))
+    print(f"flood: spammer flagged on {spammer}/20 burst messages")
+
+    # Idle eviction: a full pass once everyone has been quiet for idle_ttl
+    start = time.perf_counter()
+    freed = 0
+    while len(tracker):
+        freed += tracker.sweep(now + 601, budget=100_000)
+    print(f"flood: swept {freed} idle rows in "
+          f"{time.perf_counter() - start:.2f}s")
+
+    tracemalloc.start()
+    tracker = flood.FloodTracker()
+    for user_id in range(100_000):
+        tracker.hit(user_id % guilds, user_id, 0.0)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"flood: {size / 100_000:.0f} bytes per tracked user")
+
+
+def bench_impersonation(staff=200, joiners=50_000):
+    """Joiner name checks against a guild's indexed staff names"""
+    rng = random.Random(5)
+
+    class Member:
+        def __init__(self, user_id, name, display_name):
+            self.id, self.name, self.display_name = user_id, name, display_name
+
+    def random_name():
+        return ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(6, 14)))
+
+    protected = [Member(i, random_name(), random_name()) for i in range(staff)]
+    guard = impersonation.ImpersonationGuard()
+    start = time.perf_counter()
+    guard.build(1, protected)
+    build = time.perf_counter() - start
+
+    lookalikes = str.maketrans('aeop', 'аеор')  # Cyrillic homoglyphs
+    names = []
+    for i in range(joiners):
+        if i % 100 == 0:
+            name = rng.choice(protected).name.translate(lookalikes)
+        else:
+            name = random_name()
+        names.append((staff + i, (name, name.title())))
+
+    for label in ("cold", "cached"):
+        hits = 0
+        start = time.perf_counter()
+        for user_id, pair in names:
+            hits += guard.check(1, user_id, pair) is not None
+        elapsed = time.perf_counter() - start
+        print(f"impersonation: {joiners} {label} checks against {staff} staff "
+              f"in {elapsed:.2f}s ({elapsed / joiners * 1e6:.1f} us/check), "
+              f"{hits} hits")
+    print(f"impersonation: index built in {build * 1e3:.1f} ms")
+
+    # Pairwise baseline: one-edit comparison against every staff skeleton
+    skeletons = [impersonation.skeleton(n) for m in protected
+                 for n in (m.name, m.display_name)]
+    start = time.perf_counter()
+    for _, pair in names[:5000]:
+        for name in pair:
+            skel = impersonation.skeleton(name)
+            any(impersonation._within_one_edit(skel, p) or p in skel
+                for p in skeletons)
+    elapsed = time.perf_counter() - start
+    print(f"impersonation: pairwise baseline {elapsed / 5000 * 1e6:.1f} us/check")
+
+
+def _query_latency(cur, query, guilds, runs=300):
+    rng = random.Random(6)
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        cur.execute(query, (rng.randrange(1, guilds + 1),))
+        cur.fetchall()
+        samples.append((time.perf_counter() - start) * 1e3)
+    samples.sort()
+    return samples[len(samples) // 2], samples[int(len(samples) * 0.95)]
+
+
+def bench_retention(sizes=(100_000, 1_000_000, 3_000_000), guilds=500,
+                    backfilled=1_000_000):
+    """/banhistory latency as ban_history grows, and archive batch cost"""
+    url = os.getenv('BENCH_DATABASE_URL')
+    if not url:
+        print("retention: skipped (set BENCH_DATABASE_URL to a scratch Postgres)")
+        return
+    import psycopg2
+
+    conn = psycopg2.connect(url)
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute("drop schema if exists bench_retention cascade")
+    cur.execute("create schema bench_retention")
+    cur.execute("set search_path to bench_retention")
+    schema = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'schema.sql')
+    with open(schema, encoding='utf-8') as f:
+        cur.execute(f.read())
+
+    # The query get_ban_history sends
+    history = ("select * from ban_history where guild_id = %s "
+               "and not backfilled order by banned_at desc, id desc limit 10")
+    rows = 0
+    try:
+        for size in sizes:
+            start = time.perf_counter()
+            cur.execute(
+                "insert into ban_history (guild_id, banned_user_id, "
+                "banned_username, ban_reason, indicators, banned_at) "
+                "select 1 + g %% %s, g, 'user' || g, 'Automatic ban', "
+                "'Default avatar, No custom roles', "
+                "now() - random() * interval '730 days' "
+                "from generate_series(%s, %s) g", (guilds, rows, size - 1))
+            cur.execute("analyze ban_history")
+            load = time.perf_counter() - start
+            rows = size
+            p50, p95 = _query_latency(cur, history, guilds)
+            print(f"retention: {rows:>9,} rows (loaded in {load:.1f}s): "
+                  f"/banhistory p50 {p50:.2f} ms, p95 {p95:.2f} ms")
+
+        # /backfillbans imports: every row carries the import time
+        start = time.perf_counter()
+        cur.execute(
+            "insert into ban_history (guild_id, banned_user_id, "
+            "banned_username, ban_reason, indicators, banned_at, backfilled) "
+            "select 1 + g %% %s, g, 'user' || g, 'Imported', '', now(), true "
+            "from generate_series(%s, %s) g", (guilds, rows,
+                                               rows + backfilled - 1))
+        cur.execute("analyze ban_history")
+        load = time.perf_counter() - start
+        rows += backfilled
+        p50, p95 = _query_latency(cur, history, guilds)
+        print(f"retention: {rows:>9,} rows with {backfilled:,} backfilled "
+              f"(loaded in {load:.1f}s): /banhistory p50 {p50:.2f} ms, "
+              f"p95 {p95:.2f} ms")
+
+        cur.execute("drop index ban_history_guild_banned_at_not_backfilled")
+        p50, p95 = _query_latency(cur, history, guilds, runs=50)
+        print(f"retention: {rows:>9,} rows without the partial index: "
+              f"p50 {p50:.2f} ms, p95 {p95:.2f} ms")
+        cur.execute("drop index ban_history_guild_banned_at")
+        p50, p95 = _query_latency(cur, history, guilds, runs=20)
+        print(f"retention: {rows:>9,} rows without either index: "
+              f"p50 {p50:.2f} ms, p95 {p95:.2f} ms")
+        cur.execute("create index ban_history_guild_banned_at "
+                    "on ban_history (guild_id, banned_at desc, id desc)")
+        cur.execute("create index ban_history_guild_banned_at_not_backfilled "
+                    "on ban_history (guild_id, banned_at desc, id desc) "
+                    "where not backfilled")
+
+        # One year retention: roughly half of every guild's rows expire
+        batches = moved = 0
+        start = time.perf_counter()
+        for guild_id in range(1, 21):
+            while True:
+                cur.execute("select archive_ban_history(%s, "
+                            "now() - interval '365 days', 1000)", (guild_id,))
+                count = cur.fetchone()[0]
+                batches += 1
+                moved += count
+                if count < 1000:
+                    break
+        elapsed = time.perf_counter() - start
+        print(f"retention: archived {moved:,} rows from 20 guilds in "
+              f"{batches} batches, {elapsed / batches * 1e3:.1f} ms/batch")
+        p50, p95 = _query_latency(cur, history, guilds)
+        print(f"retention: after archiving: p50 {p50:.2f} ms, p95 {p95:.2f} ms")
+    finally:
+        cur.execute("drop schema bench_retention cascade")
+        conn.close()
+
+
+def bench_export(rows=100_000, page=1000, limit=2 * 1024 * 1024):
+    """/exportbans writer: per-page blocking time, peak memory and part split"""
+    rng = random.Random(7)
+    columns = ('id', 'banned_at', 'banned_user_id', 'banned_username',
+               'ban_reason', 'indicators', 'backfilled')
+
+    def page_rows(first):
+        return [{
+            'id': i,
+            'banned_at': f"2025-{1 + i % 12:02d}-01T00:00:{i % 60:02d}.{i:06d}+00:00",
+            'banned_user_id': rng.getrandbits(60),
+            'banned_username': _random_message(rng, 1),
+            'ban_reason': 'Automatic ban: Suspected compromised account/bot',
+            'indicators': _random_message(rng, 6),
+            'backfilled': False,
+        } for i in range(first, first + page)]
+
+    def run(fmt, directory):
+        writer = export.ExportWriter(directory, 'bans', fmt, columns, limit)
+        worst = total = 0.0
+        for first in range(0, rows, page):
+            batch = page_rows(first)
+            start = time.perf_counter()
+            writer.write_rows(batch)
+            elapsed = time.perf_counter() - start
+            worst, total = max(worst, elapsed), total + elapsed
+        return writer.close(), worst, total
+
+    for fmt in ('ndjson', 'csv'):
+        with tempfile.TemporaryDirectory() as directory:
+            paths, worst, total = run(fmt, directory)
+            sizes = [os.path.getsize(p) / 1e6 for p in paths]
+        print(f"export: {rows} rows as {fmt} in {total:.2f}s "
+              f"(worst page {worst * 1e3:.1f} ms), {len(paths)} part(s): " +
+              ", ".join(f"{mb:.1f} MB" for mb in sizes))
+
+        # Memory in a separate pass: tracemalloc slows the timing above
+        with tempfile.TemporaryDirectory() as directory:
+            tracemalloc.start()
+            run(fmt, directory)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        print(f"export: {fmt} peak traced memory {peak / 1e6:.1f} MB")
+
+BENCHMARKS = {
+    'export': bench_export,
+    'fingerprint': bench_fingerprint,
+    'flood': bench_flood,
+    'impersonation': bench_impersonation,
+    'linkscan': bench_linkscan,
+    'retention': bench_retention,
+    'scamimages': bench_scamimages,
+}
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
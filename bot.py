@@ -2,10 +2,34 @@ import discord
 from discord import app_commands
 import os
 import json
+import logging
+import math
 import aiohttp
 import asyncio
+import io
 import random
+import signal
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
+from coalesce import BANNED, TriggerCoalescer
+from detection import DecisionRecorder, evaluate, snapshot_member
+from diagnostics import Diagnostics
+from evidence import EvidenceStore
+from export import ExportWriter
+from fingerprint import BlastDetector
+from impersonation import ImpersonationGuard
+from keep_alive import publish_stats
+from logconfig import setup_logging
+from flood import FloodTracker
+from linkscan import Blocklist, scan_message
+from raid import RaidMonitor
+from scamimages import HASHING_AVAILABLE, ScamImageIndex, dhash
+from supervisor import HIGH, LOW, TaskSupervisor
+
+log = logging.getLogger('bot')
 
 intents = discord.Intents.default()
 intents.messages = True
@@ -13,7 +37,58 @@ intents.message_content = True
 intents.guilds = True
 intents.members = True
 
-client = discord.Client(intents=intents)
+# Post-ban work (log embeds, DB writes, cleanup) runs through this
+supervisor = TaskSupervisor(workers=4, queue_size=200)
+SHUTDOWN_DRAIN_TIMEOUT = 20
+
+
+class HoneypotClient(discord.Client):
+
+    async def setup_hook(self):
+        global session
+        connector = aiohttp.TCPConnector(limit=10, limit_per_host=5)
+        session = aiohttp.ClientSession(connector=connector, timeout=HTTP_TIMEOUT)
+        supervisor.start()
+        await asyncio.to_thread(evidence_store.open)
+        # Start background loops here, once per process: on_ready fires again
+        # after every non-resumed reconnect
+        self.background_tasks = [
+            asyncio.create_task(loop()) for loop in (
+                keep_alive_ping, daily_stats_loop, blocklist_reload_loop,
+                flood_sweep_loop, raid_loop, dashboard_loop, retention_loop)
+        ]
+        if HASHING_AVAILABLE:
+            known = await asyncio.to_thread(scam_images.load)
+            log.info("Loaded %d known scam image hash(es)", known,
+                     extra={'event': 'scam_images_loaded'})
+        else:
+            log.warning("Pillow not installed. Scam image matching disabled.",
+                        extra={'event': 'scam_images_disabled'})
+        try:
+            # Render/Fly stop containers with SIGTERM; shut down cleanly
+            self.loop.add_signal_handler(
+                signal.SIGTERM, lambda: self.loop.create_task(self.close()))
+        except NotImplementedError:
+            pass
+
+    async def close(self):
+        # Let queued logs and DB writes finish while the gateway and HTTP
+        # session are still usable
+        await supervisor.drain(SHUTDOWN_DRAIN_TIMEOUT)
+        await flush_daily_stats()
+        await asyncio.to_thread(evidence_store.close)
+        if decision_recorder:
+            await asyncio.to_thread(decision_recorder.close)
+        if session:
+            await session.close()
+        await super().close()
+
+
+# Recent messages kept from the gateway; the post-ban cleanup reads this first
+MESSAGE_CACHE_SIZE = 5000
+# Start of the current gateway session; messages before it were never seen
+MESSAGE_CACHE_SINCE = None
+client = HoneypotClient(intents=intents, max_messages=MESSAGE_CACHE_SIZE)
 tree = app_commands.CommandTree(client)
 
 BOT_OWNERS = {322362428883206145}
@@ -33,9 +108,145 @@ FLY_EXTERNAL_URL = f"https://{FLY_APP_NAME}.fly.dev" if FLY_APP_NAME else None
 # Caching
 GUILD_CONFIG_CACHE = {}
 BAN_HISTORY_CACHE = {}
-CACHE_TTL = 600  
+CACHE_TTL = 600
 HTTP_TIMEOUT = aiohttp.ClientTimeout(total=10)
-session = None  
+session = None
+
+# Daily activity rollups: {guild_id: {"YYYY-MM-DD": counters}}
+DAILY_STATS = {}
+DAILY_STATS_DIRTY = set()
+DAILY_STATS_LOADED = set()
+DAILY_STATS_LOADING = {}  # guild_id -> in-flight load task
+DAILY_STATS_DAYS = 30
+DAILY_STATS_FLUSH_INTERVAL = 60
+
+# Post-ban message cleanup
+CLEANUP_MAX_AGE = timedelta(days=1)
+CLEANUP_HISTORY_LIMIT = 50
+CLEANUP_CONCURRENCY = 3
+
+# Cross-channel duplicate-blast detection
+BLAST_CHANNEL_THRESHOLD = 3
+BLAST_WINDOW = 30
+BLAST_MIN_LENGTH = 10
+# Outside the honeypot a blast is only logged unless this is set
+BLAST_BAN_OUTSIDE_HONEYPOT = os.getenv('BLAST_BAN_OUTSIDE_HONEYPOT',
+                                       '0') == '1'
+blast_detector = BlastDetector(capacity=2048, window=BLAST_WINDOW)
+
+# Scam-link blocklist (reloaded when the file changes)
+BLOCKLIST_PATH = os.getenv(
+    'BLOCKLIST_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'blocklist.txt'))
+BLOCKLIST_RELOAD_INTERVAL = 60
+# Outside the honeypot a blocklisted link is only logged unless this is set
+LINK_BAN_OUTSIDE_HONEYPOT = os.getenv('LINK_BAN_OUTSIDE_HONEYPOT', '0') == '1'
+blocklist = Blocklist(BLOCKLIST_PATH)
+
+# Detections outside the honeypot that only log are reported once per user
+# per FLAG_LOG_TTL seconds
+FLAG_LOG_TTL = 300
+FLAGGED_USERS = {}  # (guild_id, user_id) -> monotonic time last reported
+
+# Known scam images, learned from honeypot attachments
+SCAM_IMAGE_INDEX_PATH = os.getenv(
+    'SCAM_IMAGE_INDEX_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                 'scam_images.txt'))
+SCAM_IMAGE_DISTANCE = 6
+SCAM_IMAGE_MAX_BYTES = 8 * 1024 * 1024
+# Outside the honeypot a known scam image is only logged unless this is set:
+# one mistaken honeypot image would otherwise be bannable everywhere
+IMAGE_BAN_OUTSIDE_HONEYPOT = os.getenv('IMAGE_BAN_OUTSIDE_HONEYPOT',
+                                       '0') == '1'
+scam_images = ScamImageIndex(SCAM_IMAGE_INDEX_PATH)
+image_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='imagehash')
+
+# Per-user message flood detection (token bucket per guild member)
+FLOOD_RATE = 1.0
+FLOOD_BURST = 8
+FLOOD_IDLE_TTL = 600
+FLOOD_SWEEP_INTERVAL = 30
+flood_tracker = FloodTracker(rate=FLOOD_RATE,
+                             burst=FLOOD_BURST,
+                             idle_ttl=FLOOD_IDLE_TTL)
+
+# Join-wave raid detection. Outside raid mode joiners are never banned on
+# arrival; in raid mode they are pre-scored in batches and anyone with at
+# least the ban threshold of indicators is banned. The three thresholds are
+# defaults that each guild can override with /setraid.
+RAID_JOIN_THRESHOLD = 10  # joins per RAID_WINDOW
+RAID_YOUNG_THRESHOLD = 6  # joins from accounts <7 days old per RAID_WINDOW
+RAID_WINDOW = 60
+RAID_DURATION = 300
+RAID_BAN_THRESHOLD = 3
+# Nearly every joiner scored during a raid has these, so they don't count
+# towards the ban threshold
+RAID_UNCOUNTED_INDICATORS = {"Joined during raid", "Joined <1 hour ago",
+                             "Joined <24 hours ago", "No custom roles"}
+RAID_BATCH_INTERVAL = 5
+RAID_RAISE_VERIFICATION = os.getenv('RAID_RAISE_VERIFICATION', '0') == '1'
+raid_monitor = RaidMonitor(join_threshold=RAID_JOIN_THRESHOLD,
+                           young_threshold=RAID_YOUNG_THRESHOLD,
+                           duration=RAID_DURATION,
+                           bucket_seconds=RAID_WINDOW // 6,
+                           buckets=6)
+RAID_PENDING = {}  # guild_id -> joiners waiting to be scored
+RECENT_JOINERS = {}  # guild_id -> deque of (monotonic time, member)
+
+# /botperf diagnostics (off until an owner enables them)
+diagnostics = Diagnostics()
+
+# Live dashboard feed (pushed to keep_alive's /events stream)
+DASHBOARD_INTERVAL = 2
+RECENT_BANS = deque(maxlen=10)
+TRIGGER_TIMES = deque(maxlen=5000)
+
+# Dry run: record each decision's inputs as NDJSON instead of banning.
+# RECORD_DECISIONS=1 records without changing behaviour.
+DRY_RUN = os.getenv('HONEYPOT_DRY_RUN', '0') == '1'
+DECISION_LOG_PATH = os.getenv('DECISION_LOG_PATH', 'decisions.ndjson')
+decision_recorder = DecisionRecorder(DECISION_LOG_PATH) if (
+    DRY_RUN or os.getenv('RECORD_DECISIONS', '0') == '1') else None
+
+# Repeated triggers from one user attach to a single in-flight ban; for
+# TRIGGER_COALESCE_TTL seconds afterwards they only delete their message.
+TRIGGER_COALESCE_TTL = 120
+trigger_coalescer = TriggerCoalescer(ttl=TRIGGER_COALESCE_TTL)
+
+# Staff impersonation: names of admins (as is_admin sees them) are indexed by
+# confusable skeleton per guild and rebuilt every IMPERSONATION_REBUILD seconds
+# or when staff roles/names change.
+IMPERSONATION_REBUILD = 600
+impersonation_guard = ImpersonationGuard(max_age=IMPERSONATION_REBUILD)
+
+# Local archive of every trigger's evidence (content, attachments, snapshot)
+# for appeals; /evidence looks a user up.
+EVIDENCE_DIR = os.getenv(
+    'EVIDENCE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'evidence'))
+evidence_store = EvidenceStore(EVIDENCE_DIR)
+
+# Backfilling existing guild bans into ban_history
+BACKFILL_BATCH_SIZE = 500
+BACKFILL_BATCH_DELAY = 1.0
+BACKFILL_MAX_RETRIES = 5
+BACKFILL_RUNNING = set()
+RAID_SAVED_VERIFICATION = {}  # guild_id -> verification level before raid
+
+# /exportbans: keyset-paged ban_history dumps, split to the upload limit
+EXPORT_PAGE_SIZE = 1000
+EXPORT_COLUMNS = ('id', 'banned_at', 'banned_user_id', 'banned_username',
+                  'ban_reason', 'indicators', 'backfilled')
+EXPORT_RUNNING = set()
+
+# ban_history retention: rows older than a guild's retention_days (default
+# below) are moved to ban_history_archive in batches. 0 keeps everything, so
+# nothing moves until a guild opts in with /setretention.
+BAN_HISTORY_RETENTION_DAYS = int(os.getenv('BAN_HISTORY_RETENTION_DAYS', '0'))
+RETENTION_INTERVAL = 6 * 60 * 60
+RETENTION_BATCH_SIZE = 1000
+RETENTION_BATCH_DELAY = 1.0
 
 def user_cooldown_key(interaction: discord.Interaction):
     return interaction.user.id  
@@ -43,7 +254,8 @@ def user_cooldown_key(interaction: discord.Interaction):
 async def init_db():
     """Initialize database tables via Supabase REST API"""
     if not SUPABASE_URL or not SUPABASE_KEY:
-        print("Supabase credentials not set. Database features disabled.")
+        log.warning("Supabase credentials not set. Database features disabled.",
+                    extra={'event': 'db_disabled'})
         return False
 
     try:
@@ -58,25 +270,30 @@ async def init_db():
             url = f"{SUPABASE_URL}/rest/v1/guild_configs?limit=1"
             async with session.get(url, headers=headers) as resp:
                 if resp.status in [200, 404]:
-                    print("Database initialized successfully")
+                    log.info("Database initialized successfully",
+                             extra={'event': 'db_ready'})
                     return True
                 elif resp.status == 401:
-                    print(
-                        "Database error: Invalid Supabase credentials (401 Unauthorized)"
-                    )
+                    log.error(
+                        "Database error: Invalid Supabase credentials (401 Unauthorized)",
+                        extra={'event': 'db_error'})
                     return False
                 else:
                     text = await resp.text()
-                    print(f"Database error ({resp.status}): {text[:150]}")
+                    log.error("Database error (%s): %s", resp.status, text[:150],
+                              extra={'event': 'db_error'})
                     return False
     except Exception as e:
         error_type = type(e).__name__
         if 'Connection' in error_type:
-            print(f"Cannot reach Supabase - check SUPABASE_URL is correct")
+            log.error("Cannot reach Supabase - check SUPABASE_URL is correct",
+                      extra={'event': 'db_error'})
         elif 'Timeout' in error_type:
-            print(f"Supabase connection timeout - server may be slow")
+            log.error("Supabase connection timeout - server may be slow",
+                      extra={'event': 'db_error'})
         else:
-            print(f"Database connection error: {error_type}")
+            log.error("Database connection error: %s", error_type,
+                      extra={'event': 'db_error'})
         return False
 
 
@@ -109,44 +326,63 @@ async def get_guild_config(guild_id):
                         result, datetime.now(timezone.utc).timestamp())
                     return result
                 else:
-                    await save_guild_config(guild_id, None, None)
-                    return await get_guild_config(guild_id)
+                    return await update_guild_config(guild_id)
             elif resp.status == 404:
-                await save_guild_config(guild_id, None, None)
-                return await get_guild_config(guild_id)
-                return None
+                return await update_guild_config(guild_id)
     except Exception as e:
         return None
 
 
-async def save_guild_config(guild_id, honeypot_channel_id, log_channel_id):
-    """Save configuration for a specific guild"""
-    if not SUPABASE_URL or not SUPABASE_KEY:
-        return False
+class ConfigConflict(Exception):
+    """A compare-and-swap config write lost to a concurrent change"""
 
-    try:
-        headers = {
-            'apikey': SUPABASE_KEY,
-            'Authorization': f'Bearer {SUPABASE_KEY}',
-            'Content-Type': 'application/json',
-            'Prefer': 'resolution=merge-duplicates'
-        }
 
-        data = {
-            'guild_id': guild_id,
-            'honeypot_channel_id': honeypot_channel_id,
-            'log_channel_id': log_channel_id,
-            'ban_reason': 'Automatic ban: Suspected compromised account/bot'
-        }
+async def update_guild_config(guild_id, expected_version=None, **fields):
+    """Write only the given config fields for a guild in one request.
 
-        url = f"{SUPABASE_URL}/rest/v1/guild_configs"
-        async with session.post(url, json=data, headers=headers, timeout=HTTP_TIMEOUT) as resp:
-            success = resp.status in [200, 201, 204]
-            if success:
-                GUILD_CONFIG_CACHE.pop(guild_id, None)
-            return success
-    except Exception as e:
-        return False
+    Without expected_version this is an upsert that creates the row if
+    needed. With it, the write only applies while the row is still at that
+    version (the database bumps `version` on every update); otherwise
+    ConfigConflict is raised. The updated row is returned and cached, or
+    None on failure.
+    """
+    if not SUPABASE_URL or not SUPABASE_KEY or not session:
+        return None
+
+    headers = {
+        'apikey': SUPABASE_KEY,
+        'Authorization': f'Bearer {SUPABASE_KEY}',
+        'Content-Type': 'application/json',
+        'Prefer': 'return=representation'
+    }
+    try:
+        if expected_version is None:
+            headers['Prefer'] += ',resolution=merge-duplicates'
+            url = f"{SUPABASE_URL}/rest/v1/guild_configs"
+            request = session.post(url, json={'guild_id': guild_id, **fields}, headers=headers, timeout=HTTP_TIMEOUT)
+        else:
+            url = f"{SUPABASE_URL}/rest/v1/guild_configs?guild_id=eq.{guild_id}&version=eq.{expected_version}"
+            request = session.patch(url, json=fields, headers=headers, timeout=HTTP_TIMEOUT)
+        async with request as resp:
+            if resp.status not in [200, 201]:
+                text = await resp.text()
+                log.error("Config update failed (%s): %s", resp.status,
+                          text[:150], extra={'event': 'db_error',
+                                             'guild_id': guild_id})
+                return None
+            data = await resp.json()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        log.warning("Config update failed: %s", e,
+                    extra={'event': 'db_error', 'guild_id': guild_id})
+        return None
+
+    if not data:
+        GUILD_CONFIG_CACHE.pop(guild_id, None)
+        raise ConfigConflict(
+            f"guild {guild_id} config is no longer at version {expected_version}")
+    row = data[0]
+    GUILD_CONFIG_CACHE[guild_id] = (row, datetime.now(timezone.utc).timestamp())
+    return row
 
 
 async def log_ban_to_db(guild_id, user_id, username, ban_reason, indicators):
@@ -180,6 +416,158 @@ async def log_ban_to_db(guild_id, user_id, username, ban_reason, indicators):
         return False
 
 
+async def insert_ban_rows(rows):
+    """Bulk-insert ban_history rows, backing off on Supabase rate limits"""
+    headers = {
+        'apikey': SUPABASE_KEY,
+        'Authorization': f'Bearer {SUPABASE_KEY}',
+        'Content-Type': 'application/json',
+        'Prefer': 'return=minimal'
+    }
+    url = f"{SUPABASE_URL}/rest/v1/ban_history"
+    delay = BACKFILL_BATCH_DELAY
+    for _ in range(BACKFILL_MAX_RETRIES):
+        try:
+            async with session.post(url, json=rows, headers=headers, timeout=HTTP_TIMEOUT) as resp:
+                if resp.status in [200, 201, 204]:
+                    return True
+                if resp.status not in [429, 500, 502, 503, 504]:
+                    text = await resp.text()
+                    log.error("Backfill insert failed (%s): %s", resp.status,
+                              text[:150], extra={'event': 'backfill_error'})
+                    return False
+                retry_after = resp.headers.get('Retry-After')
+                if retry_after and retry_after.isdigit():
+                    delay = max(delay, int(retry_after))
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            pass
+        await asyncio.sleep(delay)
+        delay *= 2
+    return False
+
+
+async def get_backfill_cursor(guild_id):
+    """Return (last_user_id, backfilled_count, completed) for a guild"""
+    headers = {
+        'apikey': SUPABASE_KEY,
+        'Authorization': f'Bearer {SUPABASE_KEY}'
+    }
+    url = f"{SUPABASE_URL}/rest/v1/ban_backfill_progress?guild_id=eq.{guild_id}"
+    try:
+        async with session.get(url, headers=headers, timeout=HTTP_TIMEOUT) as resp:
+            if resp.status == 200:
+                data = await resp.json()
+                if data:
+                    row = data[0]
+                    return (row.get('last_user_id'), row.get('backfilled') or 0,
+                            row.get('completed', False))
+    except Exception:
+        pass
+    return None, 0, False
+
+
+async def save_backfill_cursor(guild_id, last_user_id, backfilled, completed):
+    headers = {
+        'apikey': SUPABASE_KEY,
+        'Authorization': f'Bearer {SUPABASE_KEY}',
+        'Content-Type': 'application/json',
+        'Prefer': 'resolution=merge-duplicates'
+    }
+    data = {
+        'guild_id': guild_id,
+        'last_user_id': last_user_id,
+        'backfilled': backfilled,
+        'completed': completed,
+        'updated_at': datetime.now(timezone.utc).isoformat()
+    }
+    url = f"{SUPABASE_URL}/rest/v1/ban_backfill_progress"
+    try:
+        async with session.post(url, json=data, headers=headers, timeout=HTTP_TIMEOUT) as resp:
+            return resp.status in [200, 201, 204]
+    except Exception:
+        return False
+
+
+async def recorded_ban_ids(guild_id, user_ids):
+    """Return which of `user_ids` already have a ban row for the guild.
+
+    Checks the archive too, so a backfill doesn't re-import archived bans.
+    Returns None if the lookup failed.
+    """
+    headers = {
+        'apikey': SUPABASE_KEY,
+        'Authorization': f'Bearer {SUPABASE_KEY}'
+    }
+    found = set()
+    for table in ("ban_history", "ban_history_archive"):
+        # Chunked to keep the in.(...) filter well inside URL length limits
+        for i in range(0, len(user_ids), 100):
+            ids = ','.join(str(u) for u in user_ids[i:i + 100])
+            url = (f"{SUPABASE_URL}/rest/v1/{table}?guild_id=eq.{guild_id}"
+                   f"&banned_user_id=in.({ids})&select=banned_user_id")
+            try:
+                async with session.get(url, headers=headers, timeout=HTTP_TIMEOUT) as resp:
+                    if resp.status != 200:
+                        return None
+                    found.update(row['banned_user_id'] for row in await resp.json())
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                return None
+    return found
+
+
+async def backfill_guild_bans(guild, progress=None):
+    """Stream a guild's existing bans into ban_history in batches.
+
+    Bans are read with guild.bans() in ascending user-ID order starting after
+    the saved cursor, so an interrupted run resumes where it stopped. Only one
+    batch is held in memory. `progress(count)` is awaited after each batch.
+    Users that already have a ban row (e.g. banned by this bot) are skipped.
+    Returns (inserted_this_run, total_backfilled, completed).
+    """
+    last_user_id, total, completed = await get_backfill_cursor(guild.id)
+    after = discord.Object(id=last_user_id) if last_user_id else None
+    inserted = 0
+    batch = []
+    backfilled_at = datetime.now(timezone.utc).isoformat()
+
+    async def flush():
+        nonlocal inserted, total, last_user_id
+        existing = await recorded_ban_ids(
+            guild.id, [row['banned_user_id'] for row in batch])
+        if existing is None:
+            return False
+        rows = [row for row in batch if row['banned_user_id'] not in existing]
+        if rows and not await insert_ban_rows(rows):
+            return False
+        inserted += len(rows)
+        total += len(rows)
+        last_user_id = batch[-1]['banned_user_id']
+        await save_backfill_cursor(guild.id, last_user_id, total, False)
+        batch.clear()
+        BAN_HISTORY_CACHE.pop(guild.id, None)
+        if progress:
+            await progress(total)
+        await asyncio.sleep(BACKFILL_BATCH_DELAY)
+        return True
+
+    async for entry in guild.bans(limit=None, after=after):
+        batch.append({
+            'guild_id': guild.id,
+            'banned_user_id': entry.user.id,
+            'banned_username': str(entry.user),
+            'ban_reason': entry.reason or 'No reason recorded',
+            'indicators': '',
+            'banned_at': backfilled_at,
+            'backfilled': True
+        })
+        if len(batch) >= BACKFILL_BATCH_SIZE and not await flush():
+            return inserted, total, False
+    if batch and not await flush():
+        return inserted, total, False
+    await save_backfill_cursor(guild.id, last_user_id, total, True)
+    return inserted, total, True
+
+
 async def get_ban_history(guild_id):
     """Get ban history for a guild (with caching)"""
     if not SUPABASE_URL or not SUPABASE_KEY:
@@ -197,7 +585,7 @@ async def get_ban_history(guild_id):
             'Authorization': f'Bearer {SUPABASE_KEY}'
         }
 
-        url = f"{SUPABASE_URL}/rest/v1/ban_history?guild_id=eq.{guild_id}&order=banned_at.desc&limit=10"
+        url = f"{SUPABASE_URL}/rest/v1/ban_history?guild_id=eq.{guild_id}&backfilled=is.false&order=banned_at.desc,id.desc&limit=10"
         async with session.get(url, headers=headers, timeout=HTTP_TIMEOUT) as resp:
             if resp.status == 200:
                 data = await resp.json()
@@ -209,6 +597,242 @@ async def get_ban_history(guild_id):
         return []
 
 
+async def iter_ban_pages(guild_id, table="ban_history"):
+    """Yield a guild's bans a page at a time, oldest first.
+
+    Pages are keyset-paginated on (banned_at, id), so each request is an
+    index range scan no matter how deep into the history it is.
+    """
+    headers = {
+        'apikey': SUPABASE_KEY,
+        'Authorization': f'Bearer {SUPABASE_KEY}'
+    }
+    url = f"{SUPABASE_URL}/rest/v1/{table}"
+    params = {
+        'guild_id': f'eq.{guild_id}',
+        'select': ','.join(EXPORT_COLUMNS),
+        'order': 'banned_at.asc,id.asc',
+        'limit': str(EXPORT_PAGE_SIZE)
+    }
+    while True:
+        async with session.get(url, params=params, headers=headers, timeout=HTTP_TIMEOUT) as resp:
+            if resp.status != 200:
+                text = await resp.text()
+                raise RuntimeError(f"Supabase returned {resp.status}: {text[:150]}")
+            rows = await resp.json()
+        if rows:
+            yield rows
+        if len(rows) < EXPORT_PAGE_SIZE:
+            return
+        last_at, last_id = rows[-1]['banned_at'], rows[-1]['id']
+        params['or'] = (f'(banned_at.gt."{last_at}",'
+                        f'and(banned_at.eq."{last_at}",id.gt.{last_id}))')
+
+
+async def archive_ban_batch(guild_id, before):
+    """Move one batch of a guild's expired bans to the archive table.
+
+    Returns the number of rows moved, or None on failure.
+    """
+    headers = {
+        'apikey': SUPABASE_KEY,
+        'Authorization': f'Bearer {SUPABASE_KEY}',
+        'Content-Type': 'application/json'
+    }
+    data = {
+        'p_guild_id': guild_id,
+        'p_before': before.isoformat(),
+        'p_limit': RETENTION_BATCH_SIZE
+    }
+    url = f"{SUPABASE_URL}/rest/v1/rpc/archive_ban_history"
+    try:
+        async with session.post(url, json=data, headers=headers, timeout=HTTP_TIMEOUT) as resp:
+            if resp.status == 200:
+                return await resp.json()
+            text = await resp.text()
+            log.error("Archiving bans failed (%s): %s", resp.status, text[:150],
+                      extra={'event': 'retention_error', 'guild_id': guild_id})
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        log.warning("Archiving bans failed: %s", e,
+                    extra={'event': 'retention_error', 'guild_id': guild_id})
+    return None
+
+
+async def enforce_retention(guild_id):
+    """Archive a guild's bans older than its retention, batch by batch"""
+    guild_config = await get_guild_config(guild_id)
+    days = guild_config.get("retention_days") if guild_config else None
+    if days is None:
+        days = BAN_HISTORY_RETENTION_DAYS
+    if days <= 0:
+        return 0
+    start = time.perf_counter()
+    before = datetime.now(timezone.utc) - timedelta(days=days)
+    moved = 0
+    while not client.is_closed():
+        count = await archive_ban_batch(guild_id, before)
+        if not count:
+            break
+        moved += count
+        if count < RETENTION_BATCH_SIZE:
+            break
+        await asyncio.sleep(RETENTION_BATCH_DELAY)
+    if moved:
+        BAN_HISTORY_CACHE.pop(guild_id, None)
+        log.info("Archived %d ban(s) older than %d days", moved, days,
+                 extra={'event': 'retention', 'guild_id': guild_id,
+                        'duration': time.perf_counter() - start})
+    return moved
+
+
+async def retention_loop():
+    """Periodically move expired ban_history rows to the archive"""
+    await client.wait_until_ready()
+    while not client.is_closed():
+        if SUPABASE_URL and SUPABASE_KEY:
+            for guild in list(client.guilds):
+                try:
+                    await enforce_retention(guild.id)
+                except Exception:
+                    log.exception("Retention pass failed",
+                                  extra={'event': 'retention_error',
+                                         'guild_id': guild.id})
+        await asyncio.sleep(RETENTION_INTERVAL)
+
+
+def _stats_day(ts=None):
+    return (ts or datetime.now(timezone.utc)).strftime('%Y-%m-%d')
+
+
+def _empty_day_stats():
+    return {'triggers': 0, 'bans': 0, 'failed_bans': 0, 'indicators': {}}
+
+
+def record_stat(guild_id, triggers=0, bans=0, failed_bans=0, indicators=None):
+    """Bump today's rollup counters for a guild (flushed by flush_daily_stats)"""
+    day = _stats_day()
+    day_stats = DAILY_STATS.setdefault(guild_id, {}).setdefault(
+        day, _empty_day_stats())
+    day_stats['triggers'] += triggers
+    day_stats['bans'] += bans
+    day_stats['failed_bans'] += failed_bans
+    for indicator in indicators or []:
+        # Collapse "Suspicious username: 'xxx'" style details into one bucket
+        key = indicator.split(':', 1)[0]
+        day_stats['indicators'][key] = day_stats['indicators'].get(key, 0) + 1
+    DAILY_STATS_DIRTY.add((guild_id, day))
+
+
+async def load_daily_stats(guild_id):
+    """Load the last DAILY_STATS_DAYS rollup rows for a guild into memory once"""
+    if guild_id in DAILY_STATS_LOADED:
+        return
+    # Concurrent callers share one load; merging the rows twice would double
+    # the counts and the next flush would persist them
+    task = DAILY_STATS_LOADING.get(guild_id)
+    if task is None:
+        task = asyncio.ensure_future(_load_daily_stats(guild_id))
+        DAILY_STATS_LOADING[guild_id] = task
+        task.add_done_callback(
+            lambda _: DAILY_STATS_LOADING.pop(guild_id, None))
+    await asyncio.shield(task)
+
+
+async def _load_daily_stats(guild_id):
+    if not SUPABASE_URL or not SUPABASE_KEY or not session:
+        return
+
+    try:
+        headers = {
+            'apikey': SUPABASE_KEY,
+            'Authorization': f'Bearer {SUPABASE_KEY}'
+        }
+
+        since = _stats_day(datetime.now(timezone.utc) -
+                           timedelta(days=DAILY_STATS_DAYS - 1))
+        url = f"{SUPABASE_URL}/rest/v1/guild_daily_stats?guild_id=eq.{guild_id}&day=gte.{since}"
+        async with session.get(url, headers=headers, timeout=HTTP_TIMEOUT) as resp:
+            if resp.status != 200:
+                return
+            rows = await resp.json()
+    except Exception:
+        return
+
+    # Merge rather than overwrite: events may have been counted before the load
+    guild_stats = DAILY_STATS.setdefault(guild_id, {})
+    for row in rows if isinstance(rows, list) else []:
+        day_stats = guild_stats.setdefault(row['day'], _empty_day_stats())
+        for field in ('triggers', 'bans', 'failed_bans'):
+            day_stats[field] += row.get(field) or 0
+        for key, count in (row.get('indicators') or {}).items():
+            day_stats['indicators'][key] = day_stats['indicators'].get(
+                key, 0) + count
+    DAILY_STATS_LOADED.add(guild_id)
+
+
+async def flush_daily_stats():
+    """Upsert dirty rollup rows and drop days outside the retention window"""
+    # Hydrate guilds that saw events before anyone asked for their stats;
+    # rows of guilds that still failed to load are kept for the next flush
+    for guild_id in {key[0] for key in DAILY_STATS_DIRTY} - DAILY_STATS_LOADED:
+        await load_daily_stats(guild_id)
+    dirty = [key for key in DAILY_STATS_DIRTY if key[0] in DAILY_STATS_LOADED]
+    if dirty and SUPABASE_URL and SUPABASE_KEY and session:
+        headers = {
+            'apikey': SUPABASE_KEY,
+            'Authorization': f'Bearer {SUPABASE_KEY}',
+            'Content-Type': 'application/json',
+            'Prefer': 'resolution=merge-duplicates'
+        }
+        rows = [{
+            'guild_id': guild_id,
+            'day': day,
+            **DAILY_STATS[guild_id][day]
+        } for guild_id, day in dirty]
+
+        try:
+            url = f"{SUPABASE_URL}/rest/v1/guild_daily_stats?on_conflict=guild_id,day"
+            async with session.post(url, json=rows, headers=headers, timeout=HTTP_TIMEOUT) as resp:
+                if resp.status not in [200, 201, 204]:
+                    return False
+        except Exception:
+            return False
+        DAILY_STATS_DIRTY.difference_update(dirty)
+
+    cutoff = _stats_day(datetime.now(timezone.utc) -
+                        timedelta(days=DAILY_STATS_DAYS))
+    for guild_id, guild_stats in DAILY_STATS.items():
+        for day in [d for d in guild_stats if d < cutoff]:
+            del guild_stats[day]
+            DAILY_STATS_DIRTY.discard((guild_id, day))
+    return True
+
+
+async def daily_stats_loop():
+    """Periodically persist the in-memory rollup counters"""
+    await client.wait_until_ready()
+    while not client.is_closed():
+        await asyncio.sleep(DAILY_STATS_FLUSH_INTERVAL)
+        await flush_daily_stats()
+
+
+def summarize_daily_stats(guild_id, days):
+    """Sum the last `days` rollup rows for a guild - O(days), no table scans"""
+    now = datetime.now(timezone.utc)
+    guild_stats = DAILY_STATS.get(guild_id, {})
+    summary = _empty_day_stats()
+    for offset in range(days):
+        day_stats = guild_stats.get(_stats_day(now - timedelta(days=offset)))
+        if not day_stats:
+            continue
+        for field in ('triggers', 'bans', 'failed_bans'):
+            summary[field] += day_stats[field]
+        for key, count in day_stats['indicators'].items():
+            summary['indicators'][key] = summary['indicators'].get(key,
+                                                                   0) + count
+    return summary
+
+
 def get_honeypot_channel(guild):
     return None  # Will be fetched when needed
 
@@ -224,7 +848,8 @@ async def keep_alive_ping():
     # Determine which URL to use (priority order)
     keep_alive_url = RENDER_EXTERNAL_URL or FLY_EXTERNAL_URL or REPLIT_WORKSPACE_URL
     if not keep_alive_url:
-        print("No deployment URL set, skipping keep-alive pings")
+        log.info("No deployment URL set, skipping keep-alive pings",
+                 extra={'event': 'keepalive_disabled'})
         return
 
     # Detect deployment platform
@@ -235,7 +860,8 @@ async def keep_alive_ping():
     else:
         deployment = "Replit"
 
-    print(f"Keep-alive pings enabled for {deployment} ({keep_alive_url})")
+    log.info("Keep-alive pings enabled for %s (%s)", deployment, keep_alive_url,
+             extra={'event': 'keepalive_enabled'})
 
     while not client.is_closed():
         try:
@@ -243,38 +869,81 @@ async def keep_alive_ping():
                 # Send HTTPS request every 20 minutes to prevent shutdown
                 async with session.get(keep_alive_url, timeout=aiohttp.ClientTimeout(total=5)) as resp:
                     if resp.status in [200, 404]:
-                        print(f"Keep-alive ping sent to {deployment}")
+                        log.info("Keep-alive ping sent to %s", deployment,
+                                 extra={'event': 'keepalive_ping'})
         except Exception as e:
-            print(f"Keep-alive ping failed: {type(e).__name__}")
+            log.warning("Keep-alive ping failed: %s", type(e).__name__,
+                        extra={'event': 'keepalive_ping'})
 
         # Wait 20 minutes before next ping
         await asyncio.sleep(1200)
 
 
+async def blocklist_reload_loop():
+    """Load the scam-link blocklist and pick up edits to the file"""
+    while not client.is_closed():
+        try:
+            if await asyncio.to_thread(blocklist.reload_if_changed):
+                log.info("Loaded %d blocklisted domains from %s",
+                         blocklist.trie.size, BLOCKLIST_PATH,
+                         extra={'event': 'blocklist_loaded'})
+        except Exception:
+            log.exception("Failed to load blocklist",
+                          extra={'event': 'blocklist_loaded'})
+        await asyncio.sleep(BLOCKLIST_RELOAD_INTERVAL)
+
+
+async def flood_sweep_loop():
+    """Recycle flood-tracker rows of users who have gone quiet"""
+    while not client.is_closed():
+        await asyncio.sleep(FLOOD_SWEEP_INTERVAL)
+        flood_tracker.sweep()
+
+
+async def dashboard_loop():
+    """Publish live numbers for the web dashboard"""
+    await client.wait_until_ready()
+    while not client.is_closed():
+        cutoff = time.monotonic() - 60
+        while TRIGGER_TIMES and TRIGGER_TIMES[0] < cutoff:
+            TRIGGER_TIMES.popleft()
+        publish_stats({
+            'triggers_per_minute': len(TRIGGER_TIMES),
+            'latency_ms': round(client.latency * 1000)
+            if math.isfinite(client.latency) else None,
+            'guilds': len(client.guilds),
+            'queues': {
+                'raid_joiners': sum(len(m) for m in RAID_PENDING.values()),
+                'background_jobs': supervisor.pending + supervisor.running,
+                'stats_to_flush': len(DAILY_STATS_DIRTY),
+            },
+            'recent_bans': list(RECENT_BANS),
+        })
+        await asyncio.sleep(DASHBOARD_INTERVAL)
+
+
 @client.event
 async def on_ready():
-    global session
-    if not session:
-        connector = aiohttp.TCPConnector(limit=10, limit_per_host=5)
-        session = aiohttp.ClientSession(connector=connector, timeout=HTTP_TIMEOUT)
+    global MESSAGE_CACHE_SINCE
+    # on_ready also fires after a fresh (non-resumed) reconnect, whose gap
+    # the cache missed
+    MESSAGE_CACHE_SINCE = datetime.now(timezone.utc)
 
     await init_db()
 
-    print(f'{client.user} is now online!')
+    log.info("%s is now online!", client.user, extra={'event': 'ready'})
     activity = discord.Activity(type=discord.ActivityType.watching,
                                 name="the honeypot 🪤")
     await client.change_presence(activity=activity)
 
-    # Start keep-alive background task
-    client.loop.create_task(keep_alive_ping())
-    print("Keep-alive ping started (sends HTTPS request every 20 minutes)")
-
     # Sync slash commands globally (fast & efficient)
     try:
         synced = await tree.sync()
-        print("Synced 8 command(s) globally")
-    except Exception as e:
-        print(f"Failed to sync commands: {e}")
+        log.info("Synced %d command(s) globally", len(synced),
+                 extra={'event': 'commands_synced'})
+    except Exception:
+        log.exception("Failed to sync commands",
+                      extra={'event': 'commands_synced'})
 
     for guild in client.guilds:
         guild_config = await get_guild_config(guild.id)
@@ -283,57 +952,86 @@ async def on_ready():
         log_id = guild_config.get("log_channel_id") if guild_config else None
 
         status = "OK" if honeypot_id and log_id else "WARN"
-        print(
-            f"{status} {guild.name} (ID: {guild.id}) - Honeypot: {honeypot_id}, Log: {log_id}"
-        )
-
-
-def analyze_username(username):
-    indicators = []
-    suspicious_patterns = [
-        '⛧', '卐', '••', '||', '[]', '()', '⚡', '♛', '✪', 'http', '.com', '.gg',
-        'discord.gg', '000', '111', '222', '333', '444', '555', 'xxx', 'nsfw',
-        'click', 'free'
-    ]
-    username_lower = username.lower()
-    for pattern in suspicious_patterns:
-        if pattern in username_lower:
-            indicators.append(f"Suspicious username: '{pattern}'")
-            break
-    if len(username) > 25:
-        indicators.append("Very long username")
-    return indicators
-
-
-def analyze_roles(member):
-    indicators = []
-    if len(member.roles) <= 1:
-        indicators.append("No custom roles")
-    return indicators
-
-
-async def detect_suspicious_indicators(user, member):
-    indicators = []
-    now = datetime.now(timezone.utc)
-    account_age = now - user.created_at
-    if account_age < timedelta(days=1):
-        indicators.append("Account <1 day old")
-    elif account_age < timedelta(days=7):
-        indicators.append("Account <7 days old")
-    if member.joined_at:
-        join_age = now - member.joined_at
-        if join_age < timedelta(hours=1):
-            indicators.append("Joined <1 hour ago")
-        elif join_age < timedelta(hours=24):
-            indicators.append("Joined <24 hours ago")
-    if user.avatar is None:
-        indicators.append("Default avatar")
-    indicators.extend(analyze_username(user.name))
-    indicators.extend(analyze_roles(member))
-    return indicators
+        log.info("%s %s (ID: %s) - Honeypot: %s, Log: %s", status, guild.name,
+                 guild.id, honeypot_id, log_id,
+                 extra={'event': 'guild_status', 'guild_id': guild.id})
+
+
+def protected_members(guild):
+    """Members whose names are protected from impersonation"""
+    candidates = {guild.owner_id: guild.owner} if guild.owner else {}
+    for role in guild.roles:
+        if role.permissions.administrator:
+            candidates.update((m.id, m) for m in role.members)
+    for owner_id in BOT_OWNERS:
+        member = guild.get_member(owner_id)
+        if member:
+            candidates[owner_id] = member
+    return [m for m in candidates.values() if is_admin(m, guild)]
+
+
+def check_impersonation(member):
+    """Return the staff name `member` imitates, or None"""
+    guild = member.guild
+    if impersonation_guard.needs_build(guild.id):
+        impersonation_guard.build(guild.id, protected_members(guild))
+    if impersonation_guard.is_protected(guild.id, member.id):
+        return None
+    return impersonation_guard.check(guild.id, member.id,
+                                     (member.name, member.display_name))
+
+
+def build_snapshot(user, member, content=None, extra_indicators=None):
+    """Snapshot of a member for the detection rules, with live signals"""
+    signals = {'flooding': flood_tracker.is_flooding(member.guild.id, user.id)}
+    impersonating = check_impersonation(member)
+    if impersonating:
+        signals['impersonating'] = impersonating
+    if extra_indicators:
+        signals['extra'] = list(extra_indicators)
+    return snapshot_member(user, member, content, signals)
+
+
+async def detect_suspicious_indicators(user, member, content=None):
+    return evaluate(build_snapshot(user, member, content), blocklist)
+
+
+def record_decision(source, snapshot, indicators, action):
+    if decision_recorder:
+        decision_recorder.record({
+            'source': source,
+            'action': action,
+            'snapshot': snapshot,
+            'indicators': indicators,
+        })
+
+
+def record_evidence(message, source, action, snapshot=None, indicators=None):
+    """Queue a trigger's evidence for the local archive (never blocks)"""
+    evidence_store.record({
+        'ts': time.time(),
+        'guild_id': message.guild.id,
+        'user_id': message.author.id,
+        'username': str(message.author),
+        'source': source,
+        'action': action,
+        'channel_id': message.channel.id,
+        'message_id': message.id,
+        'content': message.content,
+        'attachments': [{
+            'filename': a.filename,
+            'url': a.url,
+            'size': a.size,
+            'content_type': a.content_type,
+        } for a in message.attachments],
+        'snapshot': snapshot,
+        'indicators': indicators,
+    })
 
 
 async def ban_user(member, indicators, guild):
+    start = time.perf_counter()
+    fields = {'guild_id': guild.id, 'user_id': member.id}
     try:
         guild_config = await get_guild_config(guild.id)
         ban_reason = guild_config.get(
@@ -341,14 +1039,20 @@ async def ban_user(member, indicators, guild):
         ) if guild_config else "Automatic ban: Suspected compromised account/bot"
         await member.ban(reason=ban_reason +
                          f" | Indicators: {', '.join(indicators)}",
-                         delete_message_days=1)
-        print(f"Successfully banned {member} (ID: {member.id})")
+                         delete_message_seconds=86400)
+        log.info("Successfully banned %s (ID: %s)", member, member.id,
+                 extra={'event': 'ban', 'duration': time.perf_counter() - start,
+                        **fields})
         return True
     except discord.Forbidden:
-        print(f"Missing permissions to ban {member}")
+        log.warning("Missing permissions to ban %s", member,
+                    extra={'event': 'ban_failed',
+                           'duration': time.perf_counter() - start, **fields})
         return False
-    except Exception as e:
-        print(f"Error banning {member}: {e}")
+    except Exception:
+        log.exception("Error banning %s", member,
+                      extra={'event': 'ban_failed',
+                             'duration': time.perf_counter() - start, **fields})
         return False
 
 
@@ -382,8 +1086,77 @@ async def log_detection(guild, user, message_content, indicators):
         if user.avatar:
             embed.set_thumbnail(url=user.display_avatar.url)
         await log_channel.send(embed=embed)
-    except Exception as e:
-        print(f"Error logging detection: {e}")
+    except Exception:
+        log.exception("Error logging detection",
+                      extra={'event': 'log_channel_error', 'guild_id': guild.id,
+                             'user_id': user.id})
+
+
+async def log_flagged_message(message, reason, indicators):
+    log_config = await get_guild_config(message.guild.id)
+    if not log_config or not log_config.get("log_channel_id"):
+        return
+
+    log_channel = message.guild.get_channel(log_config["log_channel_id"])
+    if not log_channel:
+        return
+
+    user = message.author
+    try:
+        embed = discord.Embed(title="Suspicious Message (not banned)",
+                              color=0xffa500,
+                              timestamp=datetime.now(timezone.utc))
+        embed.add_field(name="User",
+                        value=f"{user.mention}\n`{user}`\nID: `{user.id}`",
+                        inline=False)
+        embed.add_field(name="Channel",
+                        value=f"{message.channel.mention} "
+                        f"([message]({message.jump_url}))",
+                        inline=True)
+        embed.add_field(name="Reason", value=reason[:1024], inline=True)
+        truncated = message.content[:500] + "..." if len(
+            message.content) > 500 else message.content
+        embed.add_field(name="Message",
+                        value=f"```{truncated or '(no text)'}```",
+                        inline=False)
+        embed.add_field(name="Indicators",
+                        value="\n".join(indicators)[:1024] if indicators
+                        else "None",
+                        inline=False)
+        embed.set_footer(text="Honeypot Protection")
+        await log_channel.send(embed=embed)
+    except Exception:
+        log.exception("Error logging flagged message",
+                      extra={'event': 'log_channel_error',
+                             'guild_id': message.guild.id, 'user_id': user.id})
+
+
+def _first_flag(key):
+    """True unless `key` was already reported within FLAG_LOG_TTL"""
+    now = time.monotonic()
+    # Keys are only inserted once expired, so the dict is in time order
+    while FLAGGED_USERS:
+        oldest = next(iter(FLAGGED_USERS))
+        if now - FLAGGED_USERS[oldest] < FLAG_LOG_TTL:
+            break
+        del FLAGGED_USERS[oldest]
+    if key in FLAGGED_USERS:
+        return False
+    FLAGGED_USERS[key] = now
+    return True
+
+
+async def flag_message(message, source, reason):
+    """Report a message caught outside the honeypot without banning"""
+    if not _first_flag((message.guild.id, message.author.id)):
+        return
+    indicators = await detect_suspicious_indicators(
+        message.author, message.author, message.content)
+    log.info("Flagged %s in #%s: %s", message.author, message.channel, reason,
+             extra={'event': f'{source}_flagged', 'guild_id': message.guild.id,
+                    'user_id': message.author.id})
+    await supervisor.submit(log_flagged_message(message, reason, indicators),
+                            LOW)
 
 
 async def log_ban_result(guild, user, success, indicators):
@@ -418,24 +1191,283 @@ async def log_ban_result(guild, user, success, indicators):
                             inline=False)
         embed.set_footer(text="Honeypot Protection")
         await log_channel.send(embed=embed)
-    except Exception as e:
-        print(f"Error logging ban result: {e}")
+    except Exception:
+        log.exception("Error logging ban result",
+                      extra={'event': 'log_channel_error', 'guild_id': guild.id,
+                             'user_id': user.id})
+
+
+def _message_cache_covers(after):
+    """True if the gateway cache holds every message sent since `after`"""
+    if MESSAGE_CACHE_SINCE is None or MESSAGE_CACHE_SINCE > after:
+        return False
+    cached = client.cached_messages
+    # A full cache has evicted its oldest messages; check how far it reaches
+    return len(cached) < MESSAGE_CACHE_SIZE or cached[0].created_at <= after
+
+
+async def _collect_channel_messages(channel, user_id, after, semaphore):
+    """Scan a channel's recent history for messages by a user"""
+    async with semaphore:
+        try:
+            return [
+                m async for m in channel.history(limit=CLEANUP_HISTORY_LIMIT,
+                                                 after=after,
+                                                 oldest_first=False)
+                if m.author.id == user_id
+            ]
+        except (discord.Forbidden, discord.HTTPException):
+            return []
+
+
+async def _bulk_delete_channel(channel, messages, semaphore):
+    """Bulk-delete messages in batches of 100, returning how many went through"""
+    deleted = 0
+    async with semaphore:
+        for i in range(0, len(messages), 100):
+            batch = messages[i:i + 100]
+            try:
+                await channel.delete_messages(batch,
+                                              reason="Honeypot ban cleanup")
+                deleted += len(batch)
+            except discord.NotFound:
+                # Already removed by the ban's own purge
+                deleted += len(batch)
+            except discord.HTTPException as e:
+                log.warning("Cleanup failed in #%s: %s", channel, e,
+                            extra={'event': 'cleanup_failed',
+                                   'guild_id': channel.guild.id})
+    return deleted
+
+
+async def delete_trigger_messages(messages):
+    """Delete trigger messages with one bulk request per channel"""
+    by_channel = {}
+    for m in messages:
+        by_channel.setdefault(m.channel, []).append(m)
+    semaphore = asyncio.Semaphore(CLEANUP_CONCURRENCY)
+    await asyncio.gather(*(_bulk_delete_channel(channel, batch, semaphore)
+                           for channel, batch in by_channel.items()))
+
+
+async def cleanup_user_messages(guild, user_id, exclude_ids=()):
+    """Remove a banned user's recent messages and report where they were.
+
+    The ban itself has Discord purge the user's last day of messages
+    everywhere; this finds them in text and voice channels and active
+    threads, bulk-deletes any still there and counts the rest as purged.
+    The gateway message cache is used first; channel history is only
+    scanned when the cache doesn't reach back CLEANUP_MAX_AGE.
+    Returns {channel: removed_count}.
+    """
+    after = datetime.now(timezone.utc) - CLEANUP_MAX_AGE
+    me = guild.me
+    channels = [
+        channel for channel in (*guild.text_channels, *guild.voice_channels,
+                                *guild.threads)
+        if channel.permissions_for(me).read_message_history
+    ]
+    semaphore = asyncio.Semaphore(CLEANUP_CONCURRENCY)
+
+    # Keyed by channel object so cached messages from channels outside the
+    # scan list (e.g. archived threads) are kept
+    found = {}
+    for m in client.cached_messages:
+        if m.guild and m.guild.id == guild.id and m.author.id == user_id \
+                and m.created_at > after:
+            found.setdefault(m.channel, {})[m.id] = m
+    if not _message_cache_covers(after):
+        scanned = await asyncio.gather(*(_collect_channel_messages(
+            channel, user_id, after, semaphore) for channel in channels))
+        for channel, messages in zip(channels, scanned):
+            for m in messages:
+                found.setdefault(channel, {})[m.id] = m
+
+    counts = {}
+    targets = []
+    for channel, by_id in found.items():
+        messages = [m for m_id, m in by_id.items() if m_id not in exclude_ids]
+        if not messages:
+            continue
+        if channel.permissions_for(me).manage_messages:
+            targets.append((channel, messages))
+        else:
+            counts[channel] = len(messages)  # left to the ban's purge
+
+    deleted = await asyncio.gather(*(_bulk_delete_channel(
+        channel, messages, semaphore) for channel, messages in targets))
+    counts.update(
+        (channel, count) for (channel, _), count in zip(targets, deleted)
+        if count)
+    return counts
+
+
+async def log_cleanup_result(guild, user, counts):
+    log_config = await get_guild_config(guild.id)
+    if not log_config or not log_config.get("log_channel_id"):
+        return
+
+    log_channel = guild.get_channel(log_config["log_channel_id"])
+    if not log_channel:
+        return
+
+    try:
+        embed = discord.Embed(title="Messages Cleaned Up",
+                              color=0x7289da,
+                              timestamp=datetime.now(timezone.utc))
+        embed.add_field(name="User",
+                        value=f"{user.mention}\n`{user}`",
+                        inline=False)
+        embed.add_field(name="Removed",
+                        value=f"{sum(counts.values())} message(s) in "
+                        f"{len(counts)} channel(s)",
+                        inline=False)
+        if counts:
+            embed.add_field(name="Channels",
+                            value="\n".join(
+                                f"• {channel.mention}: {count}"
+                                for channel, count in counts.items())[:1024],
+                            inline=False)
+        embed.set_footer(text="Honeypot Protection")
+        await log_channel.send(embed=embed)
+    except Exception:
+        log.exception("Error logging cleanup result",
+                      extra={'event': 'log_channel_error', 'guild_id': guild.id,
+                             'user_id': user.id})
+
 
+async def cleanup_after_ban(guild, user, exclude_ids=()):
+    start = time.perf_counter()
+    fields = {'guild_id': guild.id, 'user_id': user.id}
+    try:
+        counts = await cleanup_user_messages(guild, user.id, exclude_ids)
+    except Exception:
+        log.exception("Error cleaning up messages for %s", user,
+                      extra={'event': 'cleanup_failed', **fields})
+        return
+    log.info("Removed %d message(s) from %s in %d channel(s)",
+             sum(counts.values()), user, len(counts),
+             extra={'event': 'cleanup', 'duration': time.perf_counter() - start,
+                    **fields})
+    await log_cleanup_result(guild, user, counts)
+
+
+def _image_attachments(message):
+    return [
+        a for a in message.attachments
+        if (a.content_type or '').startswith('image/')
+        and a.size <= SCAM_IMAGE_MAX_BYTES
+    ]
 
-async def handle_honeypot_trigger(message):
+
+async def hash_attachments(message):
+    """Download image attachments and dHash them in the worker pool"""
+    if not HASHING_AVAILABLE:
+        return []
+    loop = asyncio.get_running_loop()
+    hashes = []
+    for attachment in _image_attachments(message):
+        try:
+            data = await attachment.read()
+            hashes.append(await loop.run_in_executor(image_pool, dhash, data))
+        except Exception as e:
+            log.warning("Error hashing attachment %s: %s", attachment.filename, e,
+                        extra={'event': 'image_hash_failed',
+                               'guild_id': message.guild.id,
+                               'user_id': message.author.id})
+    return hashes
+
+
+async def learn_scam_images(message, hashes):
+    loop = asyncio.get_running_loop()
+    added = 0
+    for value in hashes:
+        if await loop.run_in_executor(image_pool, scam_images.add, value):
+            added += 1
+    if added:
+        log.info("Learned %d scam image(s) from %s", added, message.author,
+                 extra={'event': 'scam_image_learned',
+                        'guild_id': message.guild.id,
+                        'user_id': message.author.id})
+
+
+async def match_scam_image(message):
+    """Return the Hamming distance to the closest known scam image, or None"""
+    if not len(scam_images) or not _image_attachments(message):
+        return None
+    for value in await hash_attachments(message):
+        match = scam_images.nearest(value, SCAM_IMAGE_DISTANCE)
+        if match:
+            return match[0]
+    return None
+
+
+@diagnostics.timed("handle_honeypot_trigger")
+async def handle_honeypot_trigger(message, extra_indicators=None,
+                                  source="honeypot"):
+    key = (message.guild.id, message.author.id)
+    state = trigger_coalescer.begin(key, message)
+    if state is not None:
+        # Already being banned (message attached to that ban) or just banned
+        record_evidence(message, source, "coalesced")
+        if state == BANNED and not DRY_RUN:
+            await delete_trigger_messages([message])
+        return
+
+    ban_success = False
+    finished = False
     try:
         member = message.guild.get_member(message.author.id)
         if not member:
             return
 
-        indicators = await detect_suspicious_indicators(message.author, member)
-
+        snapshot = build_snapshot(message.author, member, message.content,
+                                  extra_indicators)
+        indicators = evaluate(snapshot, blocklist)
+
+        TRIGGER_TIMES.append(time.monotonic())
+        if DRY_RUN:
+            record_decision(source, snapshot, indicators, "dry_run")
+            record_evidence(message, source, "dry_run", snapshot, indicators)
+            log.info("Dry run: would ban %s", message.author,
+                     extra={'event': 'dry_run', 'guild_id': message.guild.id,
+                            'user_id': message.author.id})
+            finished = True
+            trigger_coalescer.finish(key, True)
+            return
+        hashing = None
+        # Only honeypot posts teach new images: learning from image matches
+        # would let the known set drift outward, and blast/link triggers
+        # aren't evidence the attached image is the scam
+        if source == "honeypot" and _image_attachments(message):
+            # Download alongside the ban; the message is deleted below
+            hashing = asyncio.create_task(hash_attachments(message))
         ban_success = await ban_user(member, indicators, message.guild)
-
-        try:
-            await message.delete()
-        except discord.NotFound:
-            pass
+        # Follow-up triggers from here on go straight to a plain delete (or,
+        # after a failed ban, lead a fresh attempt)
+        finished = True
+        messages = [message] + trigger_coalescer.finish(key, ban_success)
+        action = "ban" if ban_success else "ban_failed"
+        record_decision(source, snapshot, indicators, action)
+        record_evidence(message, source, action, snapshot, indicators)
+        if ban_success:
+            # Public page: no usernames or guild names
+            RECENT_BANS.appendleft({
+                'at': int(time.time()),
+                'indicators': len(indicators),
+                'top_indicator': indicators[0].split(':', 1)[0]
+                if indicators else None,
+            })
+        record_stat(message.guild.id,
+                    triggers=len(messages),
+                    bans=1 if ban_success else 0,
+                    failed_bans=0 if ban_success else 1,
+                    indicators=indicators)
+
+        hashes = await hashing if hashing else []
+        await delete_trigger_messages(messages)
+        if hashes:
+            await supervisor.submit(learn_scam_images(message, hashes), HIGH)
 
         if ban_success:
             guild_config = await get_guild_config(message.guild.id)
@@ -443,21 +1475,33 @@ async def handle_honeypot_trigger(message):
                 "ban_reason"
             ) if guild_config else "Automatic ban: Suspected compromised account/bot"
 
-            asyncio.create_task(asyncio.gather(
-                log_detection(message.guild, message.author, message.content, indicators),
-                log_ban_result(message.guild, message.author, ban_success, indicators),
+            await supervisor.submit(
                 log_ban_to_db(message.guild.id, message.author.id, str(message.author), ban_reason, indicators),
-                return_exceptions=True
-            ))
-        else:
-            asyncio.create_task(asyncio.gather(
-                log_detection(message.guild, message.author, message.content, indicators),
-                log_ban_result(message.guild, message.author, ban_success, indicators),
-                return_exceptions=True
-            ))
+                HIGH)
+            await supervisor.submit(
+                cleanup_after_ban(message.guild, message.author,
+                                  {m.id for m in messages}),
+                HIGH)
+
+        await supervisor.submit(
+            log_detection(message.guild, message.author, message.content, indicators),
+            LOW)
+        await supervisor.submit(
+            log_ban_result(message.guild, message.author, ban_success, indicators),
+            LOW)
 
-    except Exception as e:
-        print(f"Error processing honeypot: {e}")
+    except Exception:
+        log.exception("Error processing honeypot",
+                      extra={'event': 'honeypot_error',
+                             'guild_id': message.guild.id,
+                             'user_id': message.author.id})
+    finally:
+        # Only if we bailed out before finishing: by now the key may belong
+        # to a newer leader, whose entry must not be touched
+        if not finished:
+            leftover = trigger_coalescer.finish(key, False)
+            if leftover and not DRY_RUN:
+                await delete_trigger_messages(leftover)
 
 
 def is_admin(member, guild):
@@ -469,17 +1513,272 @@ def is_admin(member, guild):
 
 
 @client.event
+@diagnostics.timed("on_message")
 async def on_message(message):
-    if message.author.bot:
+    if message.author.bot or not message.guild:
         return
 
+    if flood_tracker.hit(message.guild.id, message.author.id):
+        log.info("Flood detected from %s", message.author,
+                 extra={'event': 'flood_detected',
+                        'guild_id': message.guild.id,
+                        'user_id': message.author.id})
+
     guild_config = await get_guild_config(message.guild.id)
     honeypot_id = guild_config.get(
         "honeypot_channel_id") if guild_config else None
 
     if honeypot_id and message.channel.id == honeypot_id:
         await handle_honeypot_trigger(message)
-        return 
+        return
+
+    if len(message.content) >= BLAST_MIN_LENGTH:
+        spread = blast_detector.observe(message.guild.id, message.author.id,
+                                        message.channel.id, message.content)
+        if spread >= BLAST_CHANNEL_THRESHOLD and not is_admin(
+                message.author, message.guild
+        ) and not message.author.guild_permissions.manage_messages:
+            # Moderators cross-post announcements
+            # Stable text before the colon: stats bucket on it
+            reason = (f"Cross-channel blast: same message in {spread} "
+                      f"channels within {BLAST_WINDOW}s")
+            if BLAST_BAN_OUTSIDE_HONEYPOT:
+                await handle_honeypot_trigger(message, [reason], source="blast")
+            else:
+                await flag_message(message, "blast", reason)
+            return
+
+    blocked, _ = scan_message(message.content, blocklist)
+    if blocked and not is_admin(message.author, message.guild):
+        if LINK_BAN_OUTSIDE_HONEYPOT:
+            await handle_honeypot_trigger(message, source="link")
+        else:
+            await flag_message(message, "link",
+                               f"Blocklisted link: {', '.join(blocked)}")
+        return
+
+    if is_admin(message.author, message.guild):
+        return
+    distance = await match_scam_image(message)
+    if distance is None:
+        return
+    reason = f"Known scam image: distance {distance}"
+    if IMAGE_BAN_OUTSIDE_HONEYPOT:
+        await handle_honeypot_trigger(message, [reason], source="image")
+    else:
+        await flag_message(message, "image", reason)
+
+
+async def log_raid_event(guild, title, color, fields):
+    log_config = await get_guild_config(guild.id)
+    if not log_config or not log_config.get("log_channel_id"):
+        return
+
+    log_channel = guild.get_channel(log_config["log_channel_id"])
+    if not log_channel:
+        return
+
+    try:
+        embed = discord.Embed(title=title,
+                              color=color,
+                              timestamp=datetime.now(timezone.utc))
+        for name, value in fields:
+            embed.add_field(name=name, value=value, inline=False)
+        embed.set_footer(text="Honeypot Protection")
+        await log_channel.send(embed=embed)
+    except Exception:
+        log.exception("Error logging raid event",
+                      extra={'event': 'log_channel_error', 'guild_id': guild.id})
+
+
+def raid_thresholds(guild_config):
+    """(join, young, ban) raid thresholds for a guild, defaults filled in"""
+    guild_config = guild_config or {}
+    return (guild_config.get("raid_join_threshold") or RAID_JOIN_THRESHOLD,
+            guild_config.get("raid_young_threshold") or RAID_YOUNG_THRESHOLD,
+            guild_config.get("raid_ban_threshold") or RAID_BAN_THRESHOLD)
+
+
+def _format_distribution(guild_id):
+    return "\n".join(
+        f"• {label}: {count}"
+        for label, count in raid_monitor.distribution(guild_id).items())
+
+
+async def start_raid_mode(guild):
+    log.warning("Raid detected in %s (ID: %s)", guild.name, guild.id,
+                extra={'event': 'raid_start', 'guild_id': guild.id})
+    _, _, ban_threshold = raid_thresholds(await get_guild_config(guild.id))
+    fields = [(f"Joins (last {RAID_WINDOW}s)", _format_distribution(guild.id)),
+              ("Action", f"Joiners with {ban_threshold}+ indicators "
+               "will be banned")]
+    raise_verification = RAID_RAISE_VERIFICATION and \
+        guild.verification_level < discord.VerificationLevel.high
+    if raise_verification and DRY_RUN:
+        fields.append(("Verification", "Would raise from "
+                       f"{guild.verification_level} to high (dry run)"))
+    elif raise_verification:
+        try:
+            previous = guild.verification_level
+            await guild.edit(verification_level=discord.VerificationLevel.high,
+                             reason="Raid detected")
+            RAID_SAVED_VERIFICATION[guild.id] = previous
+            fields.append(("Verification", f"Raised from {previous} to high"))
+        except discord.HTTPException as e:
+            log.warning("Failed to raise verification level in %s: %s",
+                        guild.name, e,
+                        extra={'event': 'raid_verification',
+                               'guild_id': guild.id})
+    await log_raid_event(guild, "Raid Mode Enabled", 0xff0000, fields)
+
+
+async def end_raid_mode(guild):
+    log.info("Raid mode ended in %s (ID: %s)", guild.name, guild.id,
+             extra={'event': 'raid_end', 'guild_id': guild.id})
+    fields = []
+    previous = RAID_SAVED_VERIFICATION.pop(guild.id, None)
+    if previous is not None:
+        try:
+            await guild.edit(verification_level=previous,
+                             reason="Raid mode ended")
+            fields.append(("Verification", f"Restored to {previous}"))
+        except discord.HTTPException as e:
+            log.warning("Failed to restore verification level in %s: %s",
+                        guild.name, e,
+                        extra={'event': 'raid_verification',
+                               'guild_id': guild.id})
+    await log_raid_event(guild, "Raid Mode Disabled", 0x00ff00, fields or [
+        ("Status", "No joins over the threshold for "
+         f"{RAID_DURATION // 60} minutes")
+    ])
+
+
+async def score_raid_batch(guild, members):
+    """Score a batch of raid-time joiners and ban the ones over the threshold"""
+    _, _, ban_threshold = raid_thresholds(await get_guild_config(guild.id))
+    banned = []
+    failed = 0
+    for member in members:
+        if guild.get_member(member.id) is None:
+            continue  # already left or was removed
+        snapshot = build_snapshot(member, member,
+                                  extra_indicators=["Joined during raid"])
+        indicators = evaluate(snapshot, blocklist)
+        counted = [i for i in indicators if i not in RAID_UNCOUNTED_INDICATORS]
+        if len(counted) < ban_threshold:
+            continue
+        if DRY_RUN:
+            record_decision("raid", snapshot, indicators, "dry_run")
+            continue
+        success = await ban_user(member, indicators, guild)
+        record_decision("raid", snapshot, indicators,
+                        "ban" if success else "ban_failed")
+        if success:
+            banned.append(member)
+            await log_ban_to_db(guild.id, member.id, str(member),
+                                "Automatic ban: Raid join", indicators)
+            await supervisor.submit(cleanup_after_ban(guild, member), HIGH)
+        else:
+            failed += 1
+    record_stat(guild.id, bans=len(banned), failed_bans=failed)
+    if banned or failed:
+        await log_raid_event(guild, "Raid Joiners Scored", 0xffa500, [
+            ("Scored", f"{len(members)} joiner(s)"),
+            ("Banned", "\n".join(f"• {m} (`{m.id}`)"
+                                  for m in banned)[:1024] or "None"),
+            ("Failed", str(failed)),
+        ])
+
+
+async def raid_loop():
+    """Score queued raid joiners in batches and leave expired raid modes"""
+    await client.wait_until_ready()
+    while not client.is_closed():
+        await asyncio.sleep(RAID_BATCH_INTERVAL)
+        for guild_id in list(RAID_PENDING):
+            members = RAID_PENDING.pop(guild_id, None)
+            guild = client.get_guild(guild_id)
+            if guild and members:
+                try:
+                    await score_raid_batch(guild, members)
+                except Exception:
+                    log.exception("Error scoring raid joiners",
+                                  extra={'event': 'raid_score_error',
+                                         'guild_id': guild_id})
+        for guild_id in raid_monitor.expired():
+            guild = client.get_guild(guild_id)
+            if guild:
+                await end_raid_mode(guild)
+
+
+@client.event
+@diagnostics.timed("on_member_join")
+async def on_member_join(member):
+    if member.bot:
+        return
+    guild_id = member.guild.id
+    account_age = datetime.now(timezone.utc) - member.created_at
+    join_threshold, young_threshold, _ = raid_thresholds(
+        await get_guild_config(guild_id))
+    recent = RECENT_JOINERS.get(guild_id)
+    if recent is None or recent.maxlen != join_threshold * 5:
+        recent = RECENT_JOINERS[guild_id] = deque(recent or (),
+                                                  maxlen=join_threshold * 5)
+    recent.append((time.monotonic(), member))
+
+    impersonating = check_impersonation(member)
+    if impersonating:
+        await supervisor.submit(
+            log_impersonation(member, impersonating, "Joined the server"), LOW)
+
+    if raid_monitor.on_join(guild_id, account_age.total_seconds(),
+                            join_threshold=join_threshold,
+                            young_threshold=young_threshold):
+        # Score the wave that crossed the threshold, not just later joiners
+        cutoff = time.monotonic() - RAID_WINDOW
+        RAID_PENDING.setdefault(guild_id, []).extend(
+            m for joined, m in recent if joined >= cutoff)
+        recent.clear()
+        await start_raid_mode(member.guild)
+    elif raid_monitor.in_raid(guild_id):
+        RAID_PENDING.setdefault(guild_id, []).append(member)
+
+
+async def log_impersonation(member, protected_name, context):
+    log.info("%s looks like staff member %s", member, protected_name,
+             extra={'event': 'impersonation', 'guild_id': member.guild.id,
+                    'user_id': member.id})
+    await log_raid_event(member.guild, "Possible Staff Impersonation", 0xffa500, [
+        ("User", f"{member.mention}\n`{member}`\nID: `{member.id}`"),
+        ("Display Name", member.display_name),
+        ("Looks Like", protected_name),
+        ("Context", context),
+    ])
+
+
+@client.event
+async def on_member_update(before, after):
+    if before.roles == after.roles and before.display_name == after.display_name:
+        return
+    guild_id = after.guild.id
+    if impersonation_guard.is_protected(guild_id, after.id) or is_admin(
+            after, after.guild):
+        # Staff changed: protected names are rebuilt on the next check
+        impersonation_guard.invalidate(guild_id)
+        return
+    if before.display_name != after.display_name:
+        impersonating = check_impersonation(after)
+        if impersonating:
+            await supervisor.submit(
+                log_impersonation(after, impersonating,
+                                  f"Renamed from `{before.display_name}`"),
+                LOW)
+
+
+@client.event
+async def on_guild_role_update(before, after):
+    if before.permissions.administrator != after.permissions.administrator:
+        impersonation_guard.invalidate(after.guild.id)
 
 
 @tree.command(name="sethoneypot",
@@ -497,12 +1796,10 @@ async def sethoneypot(interaction: discord.Interaction, channel_id: str):
             await interaction.response.send_message("Channel not found.",
                                                     ephemeral=True)
             return
-        guild_config = await get_guild_config(interaction.guild.id)
-        log_id = guild_config.get("log_channel_id") if guild_config else None
-        if await save_guild_config(interaction.guild.id, ch_id, log_id):
+        if await update_guild_config(interaction.guild.id,
+                                     honeypot_channel_id=ch_id):
             await interaction.response.send_message(
                 f"Honeypot channel set to {channel.mention}")
-            GUILD_CONFIG_CACHE.pop(interaction.guild.id, None)
         else:
             await interaction.response.send_message(
                 "Failed to save configuration.", ephemeral=True)
@@ -525,13 +1822,10 @@ async def setlog(interaction: discord.Interaction, channel_id: str):
             await interaction.response.send_message("Channel not found.",
                                                     ephemeral=True)
             return
-        guild_config = await get_guild_config(interaction.guild.id)
-        honeypot_id = guild_config.get(
-            "honeypot_channel_id") if guild_config else None
-        if await save_guild_config(interaction.guild.id, honeypot_id, ch_id):
+        if await update_guild_config(interaction.guild.id,
+                                     log_channel_id=ch_id):
             await interaction.response.send_message(
                 f"Log channel set to {channel.mention}")
-            GUILD_CONFIG_CACHE.pop(interaction.guild.id, None)
         else:
             await interaction.response.send_message(
                 "Failed to save configuration.", ephemeral=True)
@@ -540,6 +1834,70 @@ async def setlog(interaction: discord.Interaction, channel_id: str):
                                                 ephemeral=True)
 
 
+@tree.command(name="setretention",
+              description="Set how long ban history is kept")
+@app_commands.describe(days="Days to keep ban history (0 keeps it forever)")
+async def setretention(interaction: discord.Interaction,
+                       days: app_commands.Range[int, 0, 3650]):
+    if not is_admin(interaction.user, interaction.guild):
+        await interaction.response.send_message(
+            "You need administrator permissions.", ephemeral=True)
+        return
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        await interaction.response.send_message("Database not configured.",
+                                                ephemeral=True)
+        return
+    if not await update_guild_config(interaction.guild.id,
+                                     retention_days=days):
+        await interaction.response.send_message(
+            "Failed to save configuration.", ephemeral=True)
+        return
+    await interaction.response.send_message(
+        f"Ban history will be kept for {days} days." if days else
+        "Ban history will be kept forever.")
+
+
+@tree.command(name="setraid", description="Set this server's raid thresholds")
+@app_commands.describe(
+    join_threshold=f"Joins per {RAID_WINDOW}s that start raid mode",
+    young_threshold=f"Joins per {RAID_WINDOW}s from accounts <7 days old "
+    "that start raid mode",
+    ban_threshold="Indicators a joiner needs to be banned during a raid")
+async def setraid(interaction: discord.Interaction,
+                  join_threshold: app_commands.Range[int, 2, 1000] = None,
+                  young_threshold: app_commands.Range[int, 2, 1000] = None,
+                  ban_threshold: app_commands.Range[int, 1, 10] = None):
+    if not is_admin(interaction.user, interaction.guild):
+        await interaction.response.send_message(
+            "You need administrator permissions.", ephemeral=True)
+        return
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        await interaction.response.send_message("Database not configured.",
+                                                ephemeral=True)
+        return
+    fields = {
+        f"raid_{name}": value
+        for name, value in (("join_threshold", join_threshold),
+                            ("young_threshold", young_threshold),
+                            ("ban_threshold", ban_threshold))
+        if value is not None
+    }
+    if fields:
+        guild_config = await update_guild_config(interaction.guild.id,
+                                                 **fields)
+        if not guild_config:
+            await interaction.response.send_message(
+                "Failed to save configuration.", ephemeral=True)
+            return
+    else:
+        guild_config = await get_guild_config(interaction.guild.id)
+    joins, young, ban = raid_thresholds(guild_config)
+    await interaction.response.send_message(
+        f"Raid mode starts at {joins} joins or {young} joins from new "
+        f"accounts per {RAID_WINDOW}s, and bans joiners with {ban}+ "
+        "indicators.")
+
+
 @tree.command(name="createhoneypot",
               description="Create a new honeypot channel")
 @app_commands.describe(name="Name for the honeypot channel")
@@ -551,17 +1909,24 @@ async def createhoneypot(interaction: discord.Interaction,
         return
     try:
         await interaction.response.defer()
+        guild_config = await get_guild_config(interaction.guild.id)
+        version = guild_config.get("version") if guild_config else None
         channel = await interaction.guild.create_text_channel(
             name,
             reason="Honeypot channel created by bot",
             topic="🚨 This channel is monitored. Do not message here.")
-        guild_config = await get_guild_config(interaction.guild.id)
-        log_id = guild_config.get("log_channel_id") if guild_config else None
-        if await save_guild_config(interaction.guild.id, channel.id, log_id):
+        try:
+            saved = await update_guild_config(interaction.guild.id, version,
+                                              honeypot_channel_id=channel.id)
+        except ConfigConflict:
+            await channel.delete(reason="Honeypot configuration changed meanwhile")
+            await interaction.followup.send(
+                "The configuration was changed while the channel was being created. Please try again.")
+            return
+        if saved:
             await interaction.followup.send(
                 f"Created honeypot channel: {channel.mention}\nChannel ID: `{channel.id}`"
             )
-            GUILD_CONFIG_CACHE.pop(interaction.guild.id, None)
         else:
             await interaction.followup.send("Failed to save configuration.")
     except Exception as e:
@@ -578,19 +1943,24 @@ async def createlog(interaction: discord.Interaction,
         return
     try:
         await interaction.response.defer()
+        guild_config = await get_guild_config(interaction.guild.id)
+        version = guild_config.get("version") if guild_config else None
         channel = await interaction.guild.create_text_channel(
             name, reason="Log channel created by bot")
         await channel.set_permissions(interaction.guild.default_role,
                                       read_messages=False)
-        guild_config = await get_guild_config(interaction.guild.id)
-        honeypot_id = guild_config.get(
-            "honeypot_channel_id") if guild_config else None
-        if await save_guild_config(interaction.guild.id, honeypot_id,
-                                   channel.id):
+        try:
+            saved = await update_guild_config(interaction.guild.id, version,
+                                              log_channel_id=channel.id)
+        except ConfigConflict:
+            await channel.delete(reason="Honeypot configuration changed meanwhile")
+            await interaction.followup.send(
+                "The configuration was changed while the channel was being created. Please try again.")
+            return
+        if saved:
             await interaction.followup.send(
                 f"Created log channel: {channel.mention}\nChannel ID: `{channel.id}`"
             )
-            GUILD_CONFIG_CACHE.pop(interaction.guild.id, None)
         else:
             await interaction.followup.send("Failed to save configuration.")
     except Exception as e:
@@ -630,6 +2000,18 @@ async def honeypotconfig(interaction: discord.Interaction):
                     value=guild_config.get("ban_reason", "Not set")
                     if guild_config else "Not set",
                     inline=False)
+    retention = guild_config.get("retention_days") if guild_config else None
+    if retention is None:
+        retention = BAN_HISTORY_RETENTION_DAYS
+    embed.add_field(name="Ban History Retention",
+                    value=f"{retention} days" if retention > 0 else "Forever",
+                    inline=False)
+    joins, young, ban = raid_thresholds(guild_config)
+    embed.add_field(name="Raid Thresholds",
+                    value=f"Joins: {joins} / {RAID_WINDOW}s\n"
+                    f"New accounts: {young} / {RAID_WINDOW}s\n"
+                    f"Ban at: {ban}+ indicators",
+                    inline=False)
     await interaction.response.send_message(embed=embed)
 
 
@@ -639,6 +2021,8 @@ async def honeypotstats(interaction: discord.Interaction):
         await interaction.response.send_message(
             "You need administrator permissions.", ephemeral=True)
         return
+    # Config and stats loads can outlast the 3s interaction deadline
+    await interaction.response.defer()
     guild_config = await get_guild_config(interaction.guild.id)
     honeypot_channel = None
     log_channel = None
@@ -668,7 +2052,25 @@ async def honeypotstats(interaction: discord.Interaction):
                     inline=True)
     status = "Active" if honeypot_channel and log_channel else "Setup needed"
     embed.add_field(name="Status", value=status, inline=True)
-    await interaction.response.send_message(embed=embed)
+
+    await load_daily_stats(interaction.guild.id)
+    for label, days in (("Today", 1), ("7 Days", 7), ("30 Days", 30)):
+        summary = summarize_daily_stats(interaction.guild.id, days)
+        embed.add_field(
+            name=f"Activity ({label})",
+            value=f"Triggers: {summary['triggers']}\n"
+            f"Bans: {summary['bans']}\n"
+            f"Failed: {summary['failed_bans']}",
+            inline=True)
+    top = sorted(summarize_daily_stats(interaction.guild.id,
+                                       DAILY_STATS_DAYS)['indicators'].items(),
+                 key=lambda item: item[1],
+                 reverse=True)[:5]
+    embed.add_field(name="Top Indicators (30 Days)",
+                    value="\n".join(f"• {name}: {count}"
+                                     for name, count in top) or "None",
+                    inline=False)
+    await interaction.followup.send(embed=embed)
 
 
 @tree.command(name="banhistory",
@@ -710,9 +2112,273 @@ async def banhistory(interaction: discord.Interaction):
                 inline=False)
         embed.set_footer(text=f"Last {len(bans)} ban(s)")
         await interaction.followup.send(embed=embed)
-    except Exception as e:
+    except Exception:
         await interaction.followup.send(f"Error displaying ban history")
-        print(f"Error in banhistory: {e}")
+        log.exception("Error in banhistory",
+                      extra={'event': 'command_error',
+                             'guild_id': interaction.guild.id})
+
+
+def cache_sizes():
+    return {
+        "Guild configs": len(GUILD_CONFIG_CACHE),
+        "Ban history": len(BAN_HISTORY_CACHE),
+        "Daily stats (guilds)": len(DAILY_STATS),
+        "Messages": len(client.cached_messages),
+        "Flood tracker (users)": len(flood_tracker),
+        "Blocklisted domains": blocklist.trie.size,
+        "Scam images": len(scam_images),
+        "Raid queue": sum(len(m) for m in RAID_PENDING.values()),
+        "Coalesced triggers (users)": len(trigger_coalescer),
+        "Flagged users": len(FLAGGED_USERS),
+        "Name skeletons": len(impersonation_guard.cache),
+        "Evidence index (users)": len(evidence_store),
+    }
+
+
+@tree.command(name="exportbans",
+              description="Export this server's full ban history as a file")
+@app_commands.describe(file_format="File format (default NDJSON)",
+                       include_archived="Also export bans moved to the archive")
+@app_commands.choices(file_format=[
+    app_commands.Choice(name="NDJSON", value="ndjson"),
+    app_commands.Choice(name="CSV", value="csv"),
+])
+async def exportbans(interaction: discord.Interaction,
+                     file_format: app_commands.Choice[str] = None,
+                     include_archived: bool = False):
+    if not is_admin(interaction.user, interaction.guild):
+        await interaction.response.send_message(
+            "You need administrator permissions.", ephemeral=True)
+        return
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        await interaction.response.send_message("Database not configured.",
+                                                ephemeral=True)
+        return
+    guild = interaction.guild
+    if guild.id in EXPORT_RUNNING:
+        await interaction.response.send_message(
+            "An export is already running for this server.", ephemeral=True)
+        return
+
+    await interaction.response.defer(ephemeral=True)
+    EXPORT_RUNNING.add(guild.id)
+    fmt = file_format.value if file_format else "ndjson"
+    start = time.perf_counter()
+    try:
+        with tempfile.TemporaryDirectory(prefix="banexport-") as directory:
+            writer = ExportWriter(directory, f"bans-{guild.id}", fmt,
+                                  EXPORT_COLUMNS, guild.filesize_limit)
+            tables = ["ban_history"]
+            if include_archived:
+                tables.append("ban_history_archive")
+            try:
+                for table in tables:
+                    async for rows in iter_ban_pages(guild.id, table):
+                        # Compression and disk writes stay off the event loop
+                        await asyncio.to_thread(writer.write_rows, rows)
+            finally:
+                paths = await asyncio.to_thread(writer.close)
+
+            log.info("Exported %d ban(s) in %d file(s)", writer.rows,
+                     len(paths),
+                     extra={'event': 'ban_export', 'guild_id': guild.id,
+                            'duration': time.perf_counter() - start})
+            for number, path in enumerate(paths, 1):
+                content = (f"📦 Exported **{writer.rows}** ban(s) "
+                           f"as {fmt.upper()} (gzip)." if number == 1 else "")
+                if len(paths) > 1:
+                    content += f"\nPart {number}/{len(paths)}"
+                await interaction.followup.send(content.strip(),
+                                                file=discord.File(path),
+                                                ephemeral=True)
+    except Exception as e:
+        log.exception("Ban export failed",
+                      extra={'event': 'ban_export_failed', 'guild_id': guild.id})
+        await interaction.followup.send(f"Export failed: {type(e).__name__}",
+                                        ephemeral=True)
+    finally:
+        EXPORT_RUNNING.discard(guild.id)
+
+
+@tree.command(name="backfillbans",
+              description="Import this server's existing bans into ban history")
+async def backfillbans(interaction: discord.Interaction):
+    if not is_admin(interaction.user, interaction.guild):
+        await interaction.response.send_message(
+            "You need administrator permissions.", ephemeral=True)
+        return
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        await interaction.response.send_message("Database not configured.",
+                                                ephemeral=True)
+        return
+    guild = interaction.guild
+    if guild.id in BACKFILL_RUNNING:
+        await interaction.response.send_message(
+            "A backfill is already running for this server.", ephemeral=True)
+        return
+
+    await interaction.response.defer()
+    BACKFILL_RUNNING.add(guild.id)
+    status = await interaction.followup.send(
+        "Backfilling existing bans...", wait=True)
+
+    async def progress(total):
+        try:
+            await status.edit(content=f"Backfilling existing bans... {total:,} imported")
+        except discord.HTTPException:
+            pass
+
+    start = time.perf_counter()
+    try:
+        inserted, total, completed = await backfill_guild_bans(guild, progress)
+    except discord.Forbidden:
+        await status.edit(content="I need the Ban Members permission to read bans.")
+        return
+    except Exception:
+        log.exception("Error backfilling bans",
+                      extra={'event': 'backfill_error', 'guild_id': guild.id})
+        await status.edit(
+            content="Backfill interrupted. Run the command again to resume.")
+        return
+    finally:
+        BACKFILL_RUNNING.discard(guild.id)
+
+    log.info("Backfilled %d ban(s) in %s", inserted, guild.name,
+             extra={'event': 'backfill', 'guild_id': guild.id,
+                    'duration': time.perf_counter() - start})
+    if completed:
+        await status.edit(content=f"Backfill complete: {inserted:,} ban(s) imported "
+                          f"this run, {total:,} in total.")
+    else:
+        await status.edit(content=f"Backfill paused after {inserted:,} ban(s) "
+                          "(database unavailable). Run the command again to resume.")
+
+
+@tree.command(name="botperf", description="Bot performance diagnostics (owners only)")
+@app_commands.describe(action="start, stop, or report diagnostics")
+@app_commands.choices(action=[
+    app_commands.Choice(name="report", value="report"),
+    app_commands.Choice(name="start", value="start"),
+    app_commands.Choice(name="stop", value="stop"),
+])
+async def botperf(interaction: discord.Interaction, action: str = "report"):
+    if interaction.user.id not in BOT_OWNERS:
+        await interaction.response.send_message(
+            "This command is restricted to bot owners.", ephemeral=True)
+        return
+
+    if action == "start":
+        started = diagnostics.enable()
+        await interaction.response.send_message(
+            "Diagnostics enabled." if started else "Diagnostics already running.",
+            ephemeral=True)
+        return
+    if action == "stop":
+        stopped = diagnostics.disable()
+        await interaction.response.send_message(
+            "Diagnostics disabled." if stopped else "Diagnostics were not running.",
+            ephemeral=True)
+        return
+
+    await interaction.response.defer(ephemeral=True)
+    embed = discord.Embed(title="Bot Performance",
+                          color=0x7289da,
+                          timestamp=datetime.now(timezone.utc))
+    embed.add_field(name="Gateway Latency",
+                    value=f"{round(client.latency * 1000)}ms",
+                    inline=True)
+    total, busiest = diagnostics.pending_tasks()
+    embed.add_field(name="Pending Tasks",
+                    value=f"{total}\n" + "\n".join(
+                        f"• {name}: {count}" for name, count in busiest),
+                    inline=True)
+    jobs = supervisor.stats()
+    errors = ", ".join(f"{name} x{count}"
+                       for name, count in supervisor.errors.most_common(3))
+    embed.add_field(name="Background Jobs",
+                    value="\n".join(f"{name}: {value:,}"
+                                     for name, value in jobs.items()) +
+                    (f"\nErrors: {errors}" if errors else ""),
+                    inline=True)
+    embed.add_field(name="Cache Sizes",
+                    value="\n".join(f"• {name}: {size:,}"
+                                     for name, size in cache_sizes().items()),
+                    inline=False)
+
+    if diagnostics.enabled:
+        lag = diagnostics.lag_percentiles()
+        embed.add_field(name="Event Loop Lag",
+                        value="\n".join(f"{name}: {value * 1000:.1f}ms"
+                                         for name, value in lag.items()),
+                        inline=True)
+        slowest = diagnostics.slowest_handlers()
+        embed.add_field(
+            name="Slowest Handlers",
+            value="\n".join(f"• {name}: {duration * 1000:.0f}ms <t:{int(ts)}:R>"
+                             for duration, name, ts in slowest) or "None yet",
+            inline=False)
+        memory = await asyncio.to_thread(diagnostics.memory_diff)
+        embed.add_field(
+            name="Memory Growth (since last report)",
+            value="\n".join(
+                f"`{stat.traceback[0].filename.rsplit('/', 1)[-1]}:"
+                f"{stat.traceback[0].lineno}` {stat.size_diff / 1024:+.1f} KiB"
+                for stat in memory)[:1024] or "None",
+            inline=False)
+        since = datetime.fromtimestamp(diagnostics.enabled_at, timezone.utc)
+        embed.set_footer(
+            text=f"Diagnostics running since {since.strftime('%H:%M:%S UTC')}")
+    else:
+        embed.set_footer(text="Run /botperf start for lag, handler and memory data")
+    await interaction.followup.send(embed=embed, ephemeral=True)
+
+
+@tree.command(name="evidence",
+              description="Show stored honeypot evidence for a user (appeals)")
+@app_commands.describe(user_id="The Discord ID of the user")
+async def evidence(interaction: discord.Interaction, user_id: str):
+    if not is_admin(interaction.user, interaction.guild):
+        await interaction.response.send_message(
+            "You need administrator permissions.", ephemeral=True)
+        return
+    try:
+        u_id = int(user_id)
+    except ValueError:
+        await interaction.response.send_message(
+            "Invalid user ID. Please provide a numeric ID.", ephemeral=True)
+        return
+
+    await interaction.response.defer(ephemeral=True)
+    records = await asyncio.to_thread(evidence_store.lookup,
+                                      interaction.guild.id, u_id)
+    if not records:
+        await interaction.followup.send(
+            f"No evidence stored for `{u_id}` in this server.")
+        return
+
+    embed = discord.Embed(title="🗂️ Honeypot Evidence",
+                          description=f"{len(records)} trigger(s) for `{u_id}`",
+                          color=0x7289da,
+                          timestamp=datetime.now(timezone.utc))
+    for record in records[-5:]:
+        content = record.get('content') or ''
+        if len(content) > 300:
+            content = content[:300] + "..."
+        lines = [f"<t:{int(record['ts'])}:f> in <#{record.get('channel_id')}>"]
+        if record.get('indicators'):
+            lines.append(f"**Indicators:** {', '.join(record['indicators'])}"[:300])
+        if record.get('attachments'):
+            lines.append(f"**Attachments:** {len(record['attachments'])}")
+        lines.append(f"```{content or '(no text)'}```")
+        embed.add_field(
+            name=f"{record.get('source')}: {record.get('action')}",
+            value="\n".join(lines)[:1024],
+            inline=False)
+    data = "\n".join(json.dumps(r, ensure_ascii=False) for r in records)
+    file = discord.File(io.BytesIO(data.encode('utf-8')),
+                        filename=f"evidence-{u_id}.ndjson")
+    await interaction.followup.send(embed=embed, file=file)
 
 
 @tree.command(name="unban", description="Unban a user across all servers using their ID")
@@ -822,6 +2488,7 @@ import threading
 
 if __name__ == "__main__":
     import asyncio
+    setup_logging()
     asyncio.run(init_db())
 
     flask_thread = threading.Thread(target=keep_alive, daemon=True)
@@ -829,7 +2496,10 @@ if __name__ == "__main__":
 
     token = os.getenv('DISCORD_BOT_TOKEN')
     if token:
-        print("Starting honeypot bot with Supabase database...")
-        client.run(token)
+        log.info("Starting honeypot bot with Supabase database...",
+                 extra={'event': 'startup'})
+        # Keep discord.py on our queue-backed handler instead of its own
+        client.run(token, log_handler=None)
     else:
-        print("ERROR: DISCORD_BOT_TOKEN not set!")
+        log.critical("ERROR: DISCORD_BOT_TOKEN not set!",
+                     extra={'event': 'startup'})
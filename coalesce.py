@@ -0,0 +1,67 @@
+"""Coalescing of repeated triggers from the same (guild, user).
+
+A spam bot often posts several messages into the honeypot within a second.
+The first trigger becomes the leader and runs the ban; triggers arriving
+while that is in flight only attach their message, and the leader deletes
+them all in one batch. After the ban the user is remembered for a short TTL
+so later triggers skip straight to deleting their message.
+
+Everything runs on the event loop, so no locking is needed.
+"""
+import time
+from collections import OrderedDict
+
+PENDING = 'pending'
+BANNED = 'banned'
+
+
+class TriggerCoalescer:
+
+    def __init__(self, ttl=120.0, max_recent=10000):
+        self.ttl = ttl
+        self.max_recent = max_recent
+        self._pending = {}  # (guild_id, user_id) -> attached messages
+        self._recent = OrderedDict()  # (guild_id, user_id) -> expiry, oldest first
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self._pending) + len(self._recent)
+
+    def begin(self, key, message, now=None):
+        """Register a trigger.
+
+        Returns None if the caller should handle it (it is now the leader),
+        PENDING if the message was attached to an in-flight ban, or BANNED if
+        the user was banned within the TTL and only the message needs deleting.
+        """
+        now = time.monotonic() if now is None else now
+        expiry = self._recent.get(key)
+        if expiry is not None:
+            if expiry > now:
+                self.coalesced += 1
+                return BANNED
+            del self._recent[key]
+        attached = self._pending.get(key)
+        if attached is not None:
+            attached.append(message)
+            self.coalesced += 1
+            return PENDING
+        self._pending[key] = []
+        return None
+
+    def finish(self, key, banned, now=None):
+        """End the leader's turn; returns the messages attached meanwhile"""
+        now = time.monotonic() if now is None else now
+        attached = self._pending.pop(key, [])
+        if banned:
+            self._recent.pop(key, None)
+            self._recent[key] = now + self.ttl
+            self._prune(now)
+        return attached
+
+    def _prune(self, now):
+        # Entries share one TTL, so insertion order is expiry order
+        recent = self._recent
+        while recent and (len(recent) > self.max_recent
+                          or next(iter(recent.values())) <= now):
+            recent.popitem(last=False)
@@ -0,0 +1,155 @@
+"""Detection rules as pure functions over a plain snapshot of a user.
+
+The bot turns the discord.py objects into a snapshot dict when it makes a
+decision (`snapshot_member`) and runs `evaluate` on it. In dry-run mode the
+same snapshots are recorded as NDJSON, so replay.py can push a recorded
+corpus through changed rules offline, without Discord.
+"""
+import json
+import logging
+import queue
+import threading
+from datetime import datetime, timezone
+
+from linkscan import scan_message
+
+log = logging.getLogger('detection')
+
+HOUR = 3600
+DAY = 24 * HOUR
+_STOP = object()
+
+
+def analyze_username(username):
+    indicators = []
+    suspicious_patterns = [
+        '⛧', '卐', '••', '||', '[]', '()', '⚡', '♛', '✪', 'http', '.com', '.gg',
+        'discord.gg', '000', '111', '222', '333', '444', '555', 'xxx', 'nsfw',
+        'click', 'free'
+    ]
+    username_lower = username.lower()
+    for pattern in suspicious_patterns:
+        if pattern in username_lower:
+            indicators.append(f"Suspicious username: '{pattern}'")
+            break
+    if len(username) > 25:
+        indicators.append("Very long username")
+    return indicators
+
+
+def analyze_links(content, blocklist):
+    indicators = []
+    blocked, invites = scan_message(content, blocklist)
+    for domain in blocked:
+        indicators.append(f"Blocklisted link: {domain}")
+    if invites:
+        indicators.append("Discord invite link")
+    return indicators
+
+
+def analyze_roles(role_count):
+    indicators = []
+    if role_count <= 1:
+        indicators.append("No custom roles")
+    return indicators
+
+
+def snapshot_member(user, member, content=None, signals=None, now=None):
+    """Capture everything the rules look at as JSON-serializable values"""
+    now = now or datetime.now(timezone.utc)
+    return {
+        'ts': now.timestamp(),
+        'guild_id': member.guild.id,
+        'user_id': user.id,
+        'created_at': user.created_at.timestamp(),
+        'joined_at': member.joined_at.timestamp() if member.joined_at else None,
+        'has_avatar': user.avatar is not None,
+        'username': user.name,
+        'display_name': member.display_name,
+        'role_count': len(member.roles),
+        'message': content,
+        'signals': signals or {},
+    }
+
+
+def evaluate(snapshot, blocklist=None):
+    """Return the indicator list for a snapshot"""
+    indicators = []
+    now = snapshot['ts']
+    account_age = now - snapshot['created_at']
+    if account_age < DAY:
+        indicators.append("Account <1 day old")
+    elif account_age < 7 * DAY:
+        indicators.append("Account <7 days old")
+    if snapshot.get('joined_at'):
+        join_age = now - snapshot['joined_at']
+        if join_age < HOUR:
+            indicators.append("Joined <1 hour ago")
+        elif join_age < DAY:
+            indicators.append("Joined <24 hours ago")
+    if not snapshot.get('has_avatar'):
+        indicators.append("Default avatar")
+    signals = snapshot.get('signals') or {}
+    if signals.get('flooding'):
+        indicators.append("Flooding messages")
+    if signals.get('impersonating'):
+        indicators.append(f"Impersonating staff: {signals['impersonating']}")
+    indicators.extend(analyze_username(snapshot['username']))
+    indicators.extend(analyze_roles(snapshot.get('role_count', 0)))
+    if snapshot.get('message') and blocklist is not None:
+        indicators.extend(analyze_links(snapshot['message'], blocklist))
+    indicators.extend(signals.get('extra', []))
+    return indicators
+
+
+class DecisionRecorder:
+    """Append decision records to an NDJSON file from a background thread.
+
+    record() never blocks: records go on a bounded queue and are dropped
+    (and counted) if the writer falls behind. close() writes what is queued.
+    """
+
+    def __init__(self, path, queue_size=10000):
+        self.path = path
+        self.dropped = 0
+        self._queue = queue.Queue(queue_size)
+        self._thread = threading.Thread(target=self._run,
+                                        name='decision-recorder',
+                                        daemon=True)
+        self._thread.start()
+
+    def record(self, entry):
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout=10):
+        """Write queued records and stop the writer"""
+        if not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            entry = self._queue.get()
+            if entry is _STOP:
+                break
+            try:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                    # Write whatever else queued up while the file is open
+                    while not self._queue.empty():
+                        entry = self._queue.get_nowait()
+                        if entry is _STOP:
+                            stopping = True
+                            break
+                        f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            except Exception:
+                log.exception("Failed to write decision record",
+                              extra={'event': 'decision_record_failed'})
@@ -0,0 +1,116 @@
+"""Runtime diagnostics for /botperf.
+
+Everything here is off until enable() is called: timed handlers only check
+one attribute, no probe task runs and tracemalloc is not started.
+Once enabled, a background probe measures event-loop lag, timed handlers
+record their durations, and memory snapshots are diffed between reports.
+"""
+import asyncio
+import functools
+import time
+import tracemalloc
+from collections import Counter, deque
+
+LAG_PROBE_INTERVAL = 0.5
+TRACEMALLOC_FRAMES = 1
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))
+    return sorted_values[index]
+
+
+class Diagnostics:
+
+    def __init__(self, lag_samples=1200, handler_samples=2000):
+        self.enabled = False
+        self.enabled_at = None
+        self._lag = deque(maxlen=lag_samples)
+        self._handlers = deque(maxlen=handler_samples)
+        self._probe = None
+        self._snapshot = None
+
+    def timed(self, name):
+        """Decorator recording how long an async handler takes while enabled"""
+
+        def decorator(fn):
+
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return await fn(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    self._handlers.append(
+                        (time.perf_counter() - start, name, time.time()))
+
+            return wrapper
+
+        return decorator
+
+    async def _probe_loop(self):
+        loop = asyncio.get_running_loop()
+        while self.enabled:
+            start = loop.time()
+            await asyncio.sleep(LAG_PROBE_INTERVAL)
+            self._lag.append(max(0.0, loop.time() - start - LAG_PROBE_INTERVAL))
+
+    def enable(self):
+        if self.enabled:
+            return False
+        self.enabled = True
+        self.enabled_at = time.time()
+        self._lag.clear()
+        self._handlers.clear()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        self._snapshot = tracemalloc.take_snapshot()
+        self._probe = asyncio.create_task(self._probe_loop())
+        return True
+
+    def disable(self):
+        if not self.enabled:
+            return False
+        self.enabled = False
+        if self._probe:
+            self._probe.cancel()
+            self._probe = None
+        self._snapshot = None
+        tracemalloc.stop()
+        return True
+
+    def lag_percentiles(self):
+        """{p50/p95/p99/max: seconds} over the recent probe samples"""
+        samples = sorted(self._lag)
+        return {
+            'p50': percentile(samples, 50),
+            'p95': percentile(samples, 95),
+            'p99': percentile(samples, 99),
+            'max': samples[-1] if samples else 0.0,
+        }
+
+    def slowest_handlers(self, limit=5):
+        return sorted(self._handlers, reverse=True)[:limit]
+
+    @staticmethod
+    def pending_tasks(limit=5):
+        """(total, [(coroutine name, count)]) for tasks still pending"""
+        names = Counter()
+        for task in asyncio.all_tasks():
+            coro = task.get_coro()
+            names[getattr(coro, '__qualname__', repr(coro))] += 1
+        return sum(names.values()), names.most_common(limit)
+
+    def memory_diff(self, limit=5):
+        """Top allocation growth since the previous report, by source line"""
+        if not self.enabled or not tracemalloc.is_tracing():
+            return []
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            (tracemalloc.Filter(False, tracemalloc.__file__),))
+        stats = snapshot.compare_to(self._snapshot, 'lineno')[:limit]
+        self._snapshot = snapshot
+        return stats
@@ -0,0 +1,229 @@
+"""Append-only, block-compressed evidence archive for honeypot triggers.
+
+Records (message content, attachment URLs, user snapshot, indicators) are
+buffered into blocks of about `block_size` bytes. Each block is zlib
+compressed and appended to the current segment file as a frame:
+
+    [4-byte length][4-byte crc32][compressed NDJSON lines]
+
+After a block is on disk its (guild_id, user_id) keys are appended to
+index.tsv with the block's segment and offset, and kept in memory. An appeal
+lookup reads and decompresses only the blocks that hold that user, never a
+whole segment. All writing happens on a background thread fed by a bounded
+queue; record() never blocks and drops (and counts) records if it is full.
+
+Each open() starts a new segment, so retention is by total size: the oldest
+segments are deleted once all of them together exceed `max_bytes`.
+"""
+import json
+import logging
+import os
+import queue
+import re
+import struct
+import threading
+import time
+import zlib
+
+log = logging.getLogger('evidence')
+
+_FRAME = struct.Struct('>II')
+_SEGMENT = re.compile(r'^segment-(\d{6})\.log$')
+_STOP = object()
+
+
+class EvidenceStore:
+
+    def __init__(self, directory, block_size=64 * 1024,
+                 segment_size=64 * 1024 * 1024, max_bytes=2 * 1024 ** 3,
+                 flush_interval=5.0, queue_size=10000):
+        self.directory = directory
+        self.block_size = block_size
+        self.segment_size = segment_size
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.written = 0
+        self._queue = queue.Queue(queue_size)
+        self._index = {}  # (guild_id, user_id) -> [(segment, offset)]
+        self._lock = threading.Lock()  # guards _index and _segments
+        self._segments = []
+        self._sizes = {}  # segment -> bytes on disk
+        self._thread = None
+
+    def __len__(self):
+        return len(self._index)
+
+    @property
+    def _index_path(self):
+        return os.path.join(self.directory, 'index.tsv')
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, f'segment-{segment:06d}.log')
+
+    def open(self):
+        """Load the offset index and start the writer thread"""
+        if self._thread:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._segments = sorted(
+            int(m.group(1)) for m in map(_SEGMENT.match,
+                                         os.listdir(self.directory)) if m)
+        self._sizes = {
+            segment: os.path.getsize(self._segment_path(segment))
+            for segment in self._segments
+        }
+        live = set(self._segments)
+        torn = False
+        if os.path.exists(self._index_path):
+            with open(self._index_path, encoding='utf-8') as f:
+                for line in f:
+                    parts = line.split('\t')
+                    torn = not line.endswith('\n')
+                    if torn or len(parts) != 4:
+                        continue  # partial write from a crash
+                    guild_id, user_id, segment, offset = map(int, parts)
+                    if segment in live:
+                        self._index.setdefault((guild_id, user_id), []).append(
+                            (segment, offset))
+        if torn:
+            with open(self._index_path, 'a', encoding='utf-8') as f:
+                f.write('\n')
+        # Always append to a fresh segment so a torn tail is never extended
+        self._segments.append(self._segments[-1] + 1 if self._segments else 1)
+        self._sizes[self._segments[-1]] = 0
+        self._thread = threading.Thread(target=self._run,
+                                        name='evidence-writer', daemon=True)
+        self._thread.start()
+
+    def record(self, entry):
+        """Queue one evidence record (needs guild_id and user_id keys)"""
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout=10):
+        """Flush buffered records and stop the writer"""
+        if not self._thread:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        self._thread = None
+
+    def lookup(self, guild_id, user_id):
+        """Return every stored record for a user in a guild, oldest first.
+
+        Blocking file I/O: call from a worker thread.
+        """
+        with self._lock:
+            locations = list(self._index.get((guild_id, user_id), ()))
+        records = []
+        for segment, offset in dict.fromkeys(locations):
+            try:
+                block = self._read_block(segment, offset)
+            except (OSError, ValueError, zlib.error):
+                log.warning("Unreadable evidence block %s@%s", segment, offset,
+                            extra={'event': 'evidence_corrupt'})
+                continue
+            for line in block.splitlines():
+                entry = json.loads(line)
+                if entry.get('guild_id') == guild_id and \
+                        entry.get('user_id') == user_id:
+                    records.append(entry)
+        return records
+
+    def _read_block(self, segment, offset):
+        with open(self._segment_path(segment), 'rb') as f:
+            f.seek(offset)
+            length, checksum = _FRAME.unpack(f.read(_FRAME.size))
+            data = f.read(length)
+        if len(data) != length or zlib.crc32(data) != checksum:
+            raise ValueError("bad frame")
+        return zlib.decompress(data)
+
+    def _run(self):
+        lines, keys, size = [], set(), 0
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                entry = self._queue.get(
+                    timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                entry = None
+            if entry is _STOP:
+                break
+            if entry is not None:
+                line = json.dumps(entry, ensure_ascii=False,
+                                  separators=(',', ':')).encode('utf-8')
+                lines.append(line)
+                keys.add((entry['guild_id'], entry['user_id']))
+                size += len(line) + 1
+            if lines and (size >= self.block_size
+                          or time.monotonic() >= deadline):
+                self._write_block(lines, keys)
+                lines, keys, size = [], set(), 0
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval
+        if lines:
+            self._write_block(lines, keys)
+
+    def _write_block(self, lines, keys):
+        data = zlib.compress(b'\n'.join(lines), 6)
+        try:
+            segment = self._segments[-1]
+            path = self._segment_path(segment)
+            with open(path, 'ab') as f:
+                offset = f.tell()
+                f.write(_FRAME.pack(len(data), zlib.crc32(data)) + data)
+            # Index only after the block is written, so it never points past
+            # the end of a segment
+            with open(self._index_path, 'a', encoding='utf-8') as f:
+                f.writelines(f"{g}\t{u}\t{segment}\t{offset}\n"
+                             for g, u in keys)
+            end = offset + _FRAME.size + len(data)
+            with self._lock:
+                for key in keys:
+                    self._index.setdefault(key, []).append((segment, offset))
+                self._sizes[segment] = end
+            self.written += len(lines)
+            if end >= self.segment_size:
+                self._rotate()
+        except Exception:
+            log.exception("Failed to write evidence block",
+                          extra={'event': 'evidence_write_failed'})
+
+    def _rotate(self):
+        with self._lock:
+            self._segments.append(self._segments[-1] + 1)
+            self._sizes[self._segments[-1]] = 0
+            expired = []
+            total = sum(self._sizes.values())
+            # Never the segment just started
+            while total > self.max_bytes and len(self._segments) > 1:
+                segment = self._segments.pop(0)
+                total -= self._sizes.pop(segment)
+                expired.append(segment)
+            if not expired:
+                return
+            gone = set(expired)
+            for key in list(self._index):
+                kept = [loc for loc in self._index[key] if loc[0] not in gone]
+                if kept:
+                    self._index[key] = kept
+                else:
+                    del self._index[key]
+            # Compact the index file to the surviving entries
+            tmp = self._index_path + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                for (g, u), locations in self._index.items():
+                    f.writelines(f"{g}\t{u}\t{s}\t{o}\n" for s, o in locations)
+            os.replace(tmp, self._index_path)
+        for segment in expired:
+            try:
+                os.remove(self._segment_path(segment))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,78 @@
+"""Gzip-compressed NDJSON/CSV export files split to an upload size limit.
+
+Rows arrive a page at a time and are encoded by a generator straight into
+the gzip stream on disk, so memory holds one page regardless of export
+size. When a part gets within `margin` bytes of `max_bytes` a new part is
+started; every part is a complete gzip file (CSV parts repeat the header).
+All methods block: run them in a worker thread.
+"""
+import csv
+import gzip
+import io
+import json
+import os
+
+
+class ExportWriter:
+
+    def __init__(self, directory, basename, fmt, columns, max_bytes,
+                 margin=512 * 1024):
+        if fmt not in ('ndjson', 'csv'):
+            raise ValueError(f"unknown export format {fmt!r}")
+        self.directory = directory
+        self.basename = basename
+        self.fmt = fmt
+        self.columns = tuple(columns)
+        self.limit = max(max_bytes - margin, 64 * 1024)
+        self.rows = 0
+        self.paths = []
+        self._raw = None
+        self._text = None
+        self._csv = None
+
+    def _open_part(self):
+        path = os.path.join(
+            self.directory,
+            f"{self.basename}-part{len(self.paths) + 1}.{self.fmt}.gz")
+        self.paths.append(path)
+        self._raw = open(path, 'wb')
+        self._text = io.TextIOWrapper(gzip.GzipFile(fileobj=self._raw,
+                                                    mode='wb'),
+                                      encoding='utf-8', newline='')
+        if self.fmt == 'csv':
+            self._csv = csv.writer(self._text)
+            self._csv.writerow(self.columns)
+
+    def _close_part(self):
+        if self._text:
+            self._text.close()  # flushes the gzip trailer
+            self._raw.close()
+            self._text = self._raw = self._csv = None
+
+    def _lines(self, rows):
+        for row in rows:
+            if self.fmt == 'csv':
+                yield [row.get(column) for column in self.columns]
+            else:
+                yield json.dumps({c: row.get(c) for c in self.columns},
+                                 ensure_ascii=False) + '\n'
+
+    def write_rows(self, rows):
+        """Append one page of rows, starting a new part if this one is full"""
+        if self._raw is None:
+            self._open_part()
+        elif self._raw.tell() >= self.limit:
+            self._close_part()
+            self._open_part()
+        if self.fmt == 'csv':
+            self._csv.writerows(self._lines(rows))
+        else:
+            self._text.writelines(self._lines(rows))
+        self.rows += len(rows)
+
+    def close(self):
+        """Finish the last part; returns the part paths"""
+        if self._raw is None and not self.paths:
+            self._open_part()  # empty export still yields a (header-only) file
+        self._close_part()
+        return self.paths
@@ -0,0 +1,170 @@
+"""Rolling per-guild index of recent message fingerprints.
+
+Used to catch the classic compromised-account blast: the same scam message
+posted into several channels within a few seconds. Each message is reduced
+to an exact content hash plus a 64-bit SimHash; the SimHash is split into
+bands so near-duplicates (a changed emoji, an extra space) land on a shared
+key. Entries live in a fixed-size ring buffer and also expire after a time
+window, so memory stays flat no matter how much traffic goes through.
+"""
+import hashlib
+import re
+import time
+import unicodedata
+
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 4
+_BAND_BITS = SIMHASH_BITS // SIMHASH_BANDS
+_BAND_MASK = (1 << _BAND_BITS) - 1
+_MASK64 = (1 << 64) - 1
+
+_ZERO_WIDTH = re.compile('[\u200b-\u200f\u2060\ufeff]')
+_WHITESPACE = re.compile(r'\s+')
+_TOKEN = re.compile(r'\w+|[^\w\s]')
+
+
+def normalize(content):
+    """Case-fold, NFKC-normalize and collapse whitespace/zero-width padding"""
+    content = unicodedata.normalize('NFKC', content)
+    content = _ZERO_WIDTH.sub('', content).casefold()
+    return _WHITESPACE.sub(' ', content).strip()
+
+
+def content_hash(normalized):
+    return int.from_bytes(
+        hashlib.blake2b(normalized.encode(), digest_size=8).digest(), 'big')
+
+
+def simhash(normalized):
+    """64-bit SimHash over word unigrams and bigrams.
+
+    Instead of 64 per-bit counters, the per-column counts are kept as
+    bit-sliced planes (planes[j] holds bit j of every column's count), so
+    adding a feature is a few 64-bit word ops rather than a 64-step loop.
+    A bit is set in the result when more than half the features set it.
+    """
+    tokens = _TOKEN.findall(normalized)
+    features = tokens + [a + ' ' + b for a, b in zip(tokens, tokens[1:])]
+    planes = []
+    for feature in features:
+        carry = hash(feature) & _MASK64
+        for j, plane in enumerate(planes):
+            if not carry:
+                break
+            planes[j] = plane ^ carry
+            carry &= plane
+        if carry:
+            planes.append(carry)
+
+    # Bit-sliced "count > len(features) // 2", from the most significant plane
+    threshold = len(features) // 2
+    if threshold >> len(planes):
+        return 0
+    greater, equal = 0, _MASK64
+    for j in range(len(planes) - 1, -1, -1):
+        if threshold >> j & 1:
+            equal &= planes[j]
+        else:
+            greater |= equal & planes[j]
+            equal &= ~planes[j]
+    return greater
+
+
+def fingerprint_keys(content, user_id):
+    """Index keys for a message: one exact key plus one per SimHash band.
+
+    Two SimHashes within SIMHASH_BANDS - 1 bits of each other always share
+    at least one band, so near-duplicates collide on some key.
+    """
+    normalized = normalize(content)
+    if not normalized:
+        return ()
+    # Keys are folded into plain ints to keep the index small
+    keys = [hash((user_id, -1, content_hash(normalized)))]
+    value = simhash(normalized)
+    for band in range(SIMHASH_BANDS):
+        keys.append(
+            hash((user_id, band, value >> (band * _BAND_BITS) & _BAND_MASK)))
+    return tuple(keys)
+
+
+class FingerprintIndex:
+    """Fixed-capacity ring of (time, channel, keys) with per-key channel counts"""
+
+    def __init__(self, capacity=2048, window=30.0):
+        self.capacity = capacity
+        self.window = window
+        self._ring = [None] * capacity
+        self._head = 0  # next slot to write
+        self._size = 0
+        self._index = {}  # key -> {channel_id: live entry count}
+
+    def __len__(self):
+        return self._size
+
+    def _evict_oldest(self):
+        tail = (self._head - self._size) % self.capacity
+        _, channel_id, keys = self._ring[tail]
+        self._ring[tail] = None
+        self._size -= 1
+        for key in keys:
+            channels = self._index[key]
+            if channels[channel_id] == 1:
+                del channels[channel_id]
+                if not channels:
+                    del self._index[key]
+            else:
+                channels[channel_id] -= 1
+
+    def _expire(self, now):
+        cutoff = now - self.window
+        while self._size:
+            tail = (self._head - self._size) % self.capacity
+            if self._ring[tail][0] >= cutoff:
+                break
+            self._evict_oldest()
+
+    def observe(self, keys, channel_id, now=None):
+        """Record a message and return how many distinct channels its
+        fingerprint has been seen in within the window (including this one).
+
+        Amortized O(1): a constant number of keys per message, and every
+        entry is evicted exactly once.
+        """
+        if not keys:
+            return 0
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+        if self._size == self.capacity:
+            self._evict_oldest()
+
+        self._ring[self._head] = (now, channel_id, keys)
+        self._head = (self._head + 1) % self.capacity
+        self._size += 1
+
+        spread = 0
+        for key in keys:
+            channels = self._index.setdefault(key, {})
+            channels[channel_id] = channels.get(channel_id, 0) + 1
+            spread = max(spread, len(channels))
+        return spread
+
+
+class BlastDetector:
+    """One FingerprintIndex per guild"""
+
+    def __init__(self, capacity=2048, window=30.0):
+        self.capacity = capacity
+        self.window = window
+        self._guilds = {}
+
+    def observe(self, guild_id, user_id, channel_id, content, now=None):
+        index = self._guilds.get(guild_id)
+        if index is None:
+            index = self._guilds[guild_id] = FingerprintIndex(
+                self.capacity, self.window)
+        return index.observe(fingerprint_keys(content, user_id), channel_id,
+                             now)
+
+    def forget_guild(self, guild_id):
+        self._guilds.pop(guild_id, None)
@@ -0,0 +1,94 @@
+"""Per-guild, per-user message-rate tracking with token buckets.
+
+Every (guild, user) pair gets a row in a set of parallel `array`s (tokens,
+last-seen time, owner ids) instead of a list of datetimes, so a tracked user
+costs a dict slot plus 32 bytes. Rows of users who have gone quiet are
+recycled by an incremental sweep that only looks at a bounded number of rows
+per call, so memory stays proportional to recently active users.
+"""
+import time
+from array import array
+
+_FREED = float('inf')  # last-seen stamp of a recycled row; never looks idle
+
+
+class FloodTracker:
+
+    def __init__(self, rate=1.0, burst=8, idle_ttl=600.0):
+        self.rate = rate  # sustained messages per second
+        self.burst = burst  # messages allowed back-to-back
+        self.idle_ttl = idle_ttl
+        self._rows = {}  # guild_id -> {user_id: row}
+        self._tokens = array('d')
+        self._last = array('d')
+        self._guild = array('Q')
+        self._user = array('Q')
+        self._free = []
+        self._sweep_pos = 0
+
+    def __len__(self):
+        return len(self._tokens) - len(self._free)
+
+    def _refill(self, row, now):
+        tokens = self._tokens[row] + (now - self._last[row]) * self.rate
+        return tokens if tokens < self.burst else self.burst
+
+    def hit(self, guild_id, user_id, now=None):
+        """Count one message; returns True while the user is over the limit"""
+        now = time.monotonic() if now is None else now
+        users = self._rows.get(guild_id)
+        if users is None:
+            users = self._rows[guild_id] = {}
+        row = users.get(user_id)
+        if row is None:
+            if self._free:
+                row = self._free.pop()
+                self._tokens[row] = self.burst
+                self._last[row] = now
+                self._guild[row] = guild_id
+                self._user[row] = user_id
+            else:
+                row = len(self._tokens)
+                self._tokens.append(self.burst)
+                self._last.append(now)
+                self._guild.append(guild_id)
+                self._user.append(user_id)
+            users[user_id] = row
+
+        # Floor at -burst so a past flood does not linger for minutes
+        tokens = max(self._refill(row, now) - 1, -self.burst)
+        self._tokens[row] = tokens
+        self._last[row] = now
+        return tokens < 0
+
+    def is_flooding(self, guild_id, user_id, now=None):
+        row = self._rows.get(guild_id, {}).get(user_id)
+        if row is None:
+            return False
+        now = time.monotonic() if now is None else now
+        return self._refill(row, now) < 0
+
+    def sweep(self, now=None, budget=10_000):
+        """Free rows idle for longer than idle_ttl, visiting at most `budget`
+        rows; call it periodically and it walks the whole table in turn.
+        Returns the number of rows freed."""
+        now = time.monotonic() if now is None else now
+        total = len(self._tokens)
+        if not total:
+            return 0
+        cutoff = now - self.idle_ttl
+        freed = 0
+        for _ in range(min(budget, total)):
+            row = self._sweep_pos
+            self._sweep_pos = (row + 1) % total
+            if self._last[row] >= cutoff:
+                continue
+            guild_id = self._guild[row]
+            users = self._rows[guild_id]
+            del users[self._user[row]]
+            if not users:
+                del self._rows[guild_id]
+            self._last[row] = _FREED
+            self._free.append(row)
+            freed += 1
+        return freed
@@ -0,0 +1,196 @@
+"""Staff impersonation detection with confusable skeletons.
+
+Names are reduced to a skeleton: NFKC, accents stripped, Unicode lookalikes
+(Cyrillic/Greek letters, small capitals, leetspeak digits) folded onto one
+ASCII letter and everything but letters and digits dropped, so "Ａdmin",
+"аdmіn" and "a.d.m.1.n" all become "admln". Each guild's protected
+skeletons go into a trigram index; a joiner's name only gets compared
+against protected names sharing enough trigrams to be within one edit, so a
+lookup costs a few dict probes rather than a pass over every staff name.
+"""
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+
+MIN_SKELETON = 4  # shorter names are too generic to protect
+MIN_FUZZY = 6  # containment / one-edit matches only for names this long
+
+_CONFUSABLES = {
+    # Leetspeak and symbols
+    '0': 'o', '1': 'l', '3': 'e', '4': 'a', '5': 's', '7': 't', '8': 'b',
+    '@': 'a', '$': 's', '|': 'l', '!': 'l',
+    # Latin letters that look alike once lower-cased
+    'I': 'l', 'i': 'l', 'ı': 'l', 'ȷ': 'j', 'ɑ': 'a', 'ɡ': 'g', 'ɩ': 'l',
+    'ſ': 'f', 'ƅ': 'b', 'ǀ': 'l',
+    # Small capitals
+    'ᴀ': 'a', 'ʙ': 'b', 'ᴄ': 'c', 'ᴅ': 'd', 'ᴇ': 'e', 'ꜰ': 'f', 'ɢ': 'g',
+    'ʜ': 'h', 'ɪ': 'l', 'ᴊ': 'j', 'ᴋ': 'k', 'ʟ': 'l', 'ᴍ': 'm', 'ɴ': 'n',
+    'ᴏ': 'o', 'ᴘ': 'p', 'ʀ': 'r', 'ꜱ': 's', 'ᴛ': 't', 'ᴜ': 'u', 'ᴠ': 'v',
+    'ᴡ': 'w', 'ʏ': 'y', 'ᴢ': 'z',
+    # Cyrillic
+    'а': 'a', 'в': 'b', 'е': 'e', 'к': 'k', 'м': 'm', 'н': 'h', 'о': 'o',
+    'р': 'p', 'с': 'c', 'т': 't', 'у': 'y', 'х': 'x', 'ѕ': 's', 'і': 'l',
+    'ј': 'j', 'һ': 'h', 'ԁ': 'd', 'ӏ': 'l', 'ԛ': 'q', 'ԝ': 'w', 'ь': 'b',
+    'А': 'a', 'В': 'b', 'Е': 'e', 'К': 'k', 'М': 'm', 'Н': 'h', 'О': 'o',
+    'Р': 'p', 'С': 'c', 'Т': 't', 'У': 'y', 'Х': 'x', 'Ѕ': 's', 'І': 'l',
+    'Ј': 'j', 'Ӏ': 'l',
+    # Greek
+    'α': 'a', 'β': 'b', 'γ': 'y', 'ε': 'e', 'η': 'n', 'ι': 'l', 'κ': 'k',
+    'ν': 'v', 'ο': 'o', 'ρ': 'p', 'τ': 't', 'υ': 'u', 'χ': 'x', 'ω': 'w',
+    'Α': 'a', 'Β': 'b', 'Ε': 'e', 'Ζ': 'z', 'Η': 'h', 'Ι': 'l', 'Κ': 'k',
+    'Μ': 'm', 'Ν': 'n', 'Ο': 'o', 'Ρ': 'p', 'Τ': 't', 'Υ': 'y', 'Χ': 'x',
+}
+_TABLE = str.maketrans(_CONFUSABLES)
+# Multi-letter lookalikes, applied after single letters are folded
+_DIGRAPHS = (('rn', 'm'), ('vv', 'w'), ('cl', 'd'))
+
+
+def skeleton(name):
+    """Fold a display name to its confusable skeleton"""
+    text = unicodedata.normalize('NFKC', name)
+    text = ''.join(c for c in unicodedata.normalize('NFD', text)
+                   if not unicodedata.combining(c))
+    text = text.translate(_TABLE).casefold().translate(_TABLE)
+    text = ''.join(c for c in text if c.isascii() and c.isalnum())
+    for digraph, letter in _DIGRAPHS:
+        text = text.replace(digraph, letter)
+    return text
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _within_one_edit(a, b):
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return a[i + 1:] == b[i + 1:]  # substitution
+    return a[i:] == b[i + 1:]  # insertion
+
+
+class SkeletonCache:
+    """Skeletons per user ID, recomputed only when their names change"""
+
+    def __init__(self, capacity=50000):
+        self.capacity = capacity
+        self._entries = OrderedDict()  # user_id -> (names, skeletons)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, user_id, names):
+        names = tuple(names)
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] == names:
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        skeletons = tuple(skeleton(n) for n in names)
+        self._entries[user_id] = (names, skeletons)
+        self._entries.move_to_end(user_id)
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+        return skeletons
+
+
+class ProtectedNames:
+    """Trigram index over one guild's protected (staff) name skeletons"""
+
+    def __init__(self, entries):
+        # entries: iterable of (user_id, name, skeleton)
+        self._exact = {}  # skeleton -> [(user_id, name)]
+        self._fuzzy = []  # (user_id, name, skeleton, trigram count)
+        self._postings = {}  # trigram -> [index into _fuzzy]
+        self.owners = set()
+        for user_id, name, skel in entries:
+            self.owners.add(user_id)
+            if len(skel) < MIN_SKELETON:
+                continue
+            self._exact.setdefault(skel, []).append((user_id, name))
+            if len(skel) >= MIN_FUZZY:
+                grams = _trigrams(skel)
+                index = len(self._fuzzy)
+                self._fuzzy.append((user_id, name, skel, len(grams)))
+                for gram in grams:
+                    self._postings.setdefault(gram, []).append(index)
+
+    def __len__(self):
+        return sum(len(v) for v in self._exact.values())
+
+    def match(self, skel, user_id):
+        """Return the protected name `skel` impersonates, or None"""
+        for owner, name in self._exact.get(skel, ()):
+            if owner != user_id:
+                return name
+        if len(skel) < MIN_FUZZY - 1 or not self._postings:
+            return None
+        shared = Counter()
+        for gram in _trigrams(skel):
+            for index in self._postings.get(gram, ()):
+                shared[index] += 1
+        for index, count in shared.items():
+            owner, name, protected, grams = self._fuzzy[index]
+            if owner == user_id:
+                continue
+            # One edit breaks at most three trigrams; containment keeps all
+            if count == grams and protected in skel:
+                return name
+            if count >= grams - 3 and _within_one_edit(skel, protected):
+                return name
+        return None
+
+
+class ImpersonationGuard:
+    """Per-guild protected-name indexes, rebuilt when stale or invalidated"""
+
+    def __init__(self, max_age=600.0, cache_size=50000):
+        self.max_age = max_age
+        self.cache = SkeletonCache(cache_size)
+        self._indexes = {}  # guild_id -> (built_at, ProtectedNames)
+
+    def __len__(self):
+        return len(self._indexes)
+
+    def needs_build(self, guild_id, now=None):
+        now = time.monotonic() if now is None else now
+        entry = self._indexes.get(guild_id)
+        return entry is None or now - entry[0] > self.max_age
+
+    def build(self, guild_id, members, now=None):
+        """Index the names of `members` (objects with id, name, display_name)"""
+        now = time.monotonic() if now is None else now
+        entries = []
+        for member in members:
+            names = (member.name, member.display_name)
+            for name, skel in zip(names, self.cache.get(member.id, names)):
+                entries.append((member.id, name, skel))
+        self._indexes[guild_id] = (now, ProtectedNames(entries))
+
+    def invalidate(self, guild_id):
+        self._indexes.pop(guild_id, None)
+
+    def is_protected(self, guild_id, user_id):
+        entry = self._indexes.get(guild_id)
+        return entry is not None and user_id in entry[1].owners
+
+    def check(self, guild_id, user_id, names):
+        """Return the protected name one of `names` imitates, or None"""
+        entry = self._indexes.get(guild_id)
+        if entry is None:
+            return None
+        for skel in self.cache.get(user_id, names):
+            name = entry[1].match(skel, user_id)
+            if name is not None:
+                return name
+        return None
@@ -1,8 +1,10 @@
-from flask import Flask, jsonify
-from threading import Thread
+from flask import Flask, Response, jsonify, request
+from threading import BoundedSemaphore, Condition, Thread
+import gzip
+import hashlib
+import json
 import time
 import os
-from datetime import datetime, timezone
 
 app = Flask('')
 
@@ -10,42 +12,48 @@ app = Flask('')
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY')
 
-@app.route('/')
-def dashboard():
-    """Main dashboard page"""
-    return f"""
+# Seconds between SSE keep-alive comments when nothing changes
+SSE_HEARTBEAT = 15
+# Each /events stream holds a server thread, so their number is capped and
+# each one ends after SSE_MAX_AGE (the browser reconnects). Viewers beyond
+# the cap get a 503 and poll /api/stats instead.
+SSE_MAX_CLIENTS = 10
+SSE_MAX_AGE = 300
+SSE_POLL_INTERVAL = 30
+
+DASHBOARD_HTML = """
     <!DOCTYPE html>
     <html>
     <head>
         <title>GOONER MACHINE BOT</title>
         <meta name="viewport" content="width=device-width, initial-scale=1.0">
         <style>
-            * {{
+            * {
                 margin: 0;
                 padding: 0;
                 box-sizing: border-box;
-            }}
-            body {{
+            }
+            body {
                 font-family: 'Courier New', monospace;
                 background: #0a0a0a;
                 color: #ccc;
                 min-height: 100vh;
                 padding: 40px 20px;
-            }}
-            .container {{
+            }
+            .container {
                 max-width: 900px;
                 margin: 0 auto;
-            }}
-            header {{
+            }
+            header {
                 margin-bottom: 50px;
-            }}
-            h1 {{
+            }
+            h1 {
                 font-size: 2em;
                 margin-bottom: 15px;
                 font-weight: normal;
                 letter-spacing: 2px;
-            }}
-            .status-badge {{
+            }
+            .status-badge {
                 display: inline-block;
                 color: #1db854;
                 padding: 6px 12px;
@@ -53,93 +61,93 @@ def dashboard():
                 margin-top: 15px;
                 border: 1px solid #1db854;
                 background: transparent;
-            }}
-            .grid {{
+            }
+            .grid {
                 display: grid;
                 grid-template-columns: repeat(auto-fit, minmax(280px, 1fr));
                 gap: 30px;
                 margin-bottom: 50px;
-            }}
-            .card {{
+            }
+            .card {
                 background: #111;
                 padding: 30px;
                 border: 1px solid #222;
-            }}
-            .card:hover {{
+            }
+            .card:hover {
                 border-color: #333;
-            }}
-            .stat-number {{
+            }
+            .stat-number {
                 font-size: 2em;
                 font-weight: normal;
                 margin: 15px 0;
                 color: #1db854;
                 font-family: 'Courier New', monospace;
-            }}
-            .stat-label {{
+            }
+            .stat-label {
                 font-size: 0.85em;
                 opacity: 0.6;
                 text-transform: uppercase;
                 letter-spacing: 1px;
-            }}
-            .section {{
+            }
+            .section {
                 background: #111;
                 padding: 30px;
                 margin-bottom: 50px;
                 border: 1px solid #222;
-            }}
-            .section h2 {{
+            }
+            .section h2 {
                 margin-bottom: 25px;
                 font-size: 1.2em;
                 border-bottom: 1px solid #333;
                 padding-bottom: 15px;
                 font-weight: normal;
-            }}
-            .info {{
+            }
+            .info {
                 background: transparent;
                 padding: 12px 0;
                 margin: 15px 0;
                 border-left: 2px solid #333;
                 padding-left: 15px;
                 line-height: 1.6;
-            }}
-            .footer {{
+            }
+            .footer {
                 text-align: center;
                 margin-top: 60px;
                 opacity: 0.5;
                 font-size: 0.85em;
                 border-top: 1px solid #222;
                 padding-top: 30px;
-            }}
-            .refresh-timer {{
+            }
+            .refresh-timer {
                 text-align: center;
                 margin-top: 20px;
                 opacity: 0.4;
                 font-size: 0.8em;
-            }}
-            .database-status {{
+            }
+            .database-status {
                 padding: 12px 0;
                 margin-top: 20px;
                 border-left: 2px solid #333;
                 padding-left: 15px;
-            }}
-            code {{
+            }
+            code {
                 background: transparent;
                 padding: 0;
                 color: #1db854;
                 font-family: 'Courier New', monospace;
-            }}
-            @media (max-width: 768px) {{
-                h1 {{
+            }
+            @media (max-width: 768px) {
+                h1 {
                     font-size: 1.5em;
-                }}
-                .grid {{
+                }
+                .grid {
                     grid-template-columns: 1fr;
                     gap: 20px;
-                }}
-                body {{
+                }
+                body {
                     padding: 20px;
-                }}
-            }}
+                }
+            }
         </style>
     </head>
     <body>
@@ -161,10 +169,32 @@ def dashboard():
                 <div class="card">
                     <div class="stat-label">Current Time</div>
                     <div style="margin-top: 15px; font-size: 0.95em;" id="current-time">
-                        {datetime.now(timezone.utc).strftime('%H:%M:%S UTC')}
+                        --:--:-- UTC
                     </div>
                 </div>
             </div>
+
+            <div class="grid">
+                <div class="card">
+                    <div class="stat-label">Triggers / Minute</div>
+                    <div class="stat-number" id="triggers-per-minute">-</div>
+                </div>
+                <div class="card">
+                    <div class="stat-label">Gateway Latency</div>
+                    <div class="stat-number" id="latency">-</div>
+                </div>
+                <div class="card">
+                    <div class="stat-label">Queue Depths</div>
+                    <div style="margin-top: 15px; font-size: 0.95em;" id="queues">-</div>
+                </div>
+            </div>
+
+            <div class="section">
+                <h2>Recent Bans</h2>
+                <div id="recent-bans">
+                    <div class="info">No bans yet</div>
+                </div>
+            </div>
             
             <div class="section">
                 <h2>Bot Information</h2>
@@ -175,7 +205,7 @@ def dashboard():
                     <strong>Status:</strong> Running & Monitoring
                 </div>
                 <div class="info">
-                    <strong>Slash Commands:</strong> 7 Available
+                    <strong>Slash Commands:</strong> 15 Available
                 </div>
                 <div class="database-status">
                     <strong>Database:</strong> Connected to Supabase
@@ -187,7 +217,8 @@ def dashboard():
                 <div class="info">
                     <code>/health</code> - Health check<br>
                     <code>/status</code> - Service status<br>
-                    <code>/api/stats</code> - Real-time statistics
+                    <code>/api/stats</code> - Real-time statistics<br>
+                    <code>/events</code> - Live statistics stream (Server-Sent Events)
                 </div>
             </div>
             
@@ -198,36 +229,170 @@ def dashboard():
                     <code>/createlog</code> - Create log channel<br>
                     <code>/sethoneypot</code> - Set honeypot channel<br>
                     <code>/setlog</code> - Set log channel<br>
+                    <code>/setretention</code> - Set ban history retention<br>
+                    <code>/setraid</code> - Set raid thresholds<br>
                     <code>/honeypotconfig</code> - View configuration<br>
                     <code>/honeypotstats</code> - View statistics<br>
-                    <code>/banhistory</code> - View ban history
+                    <code>/banhistory</code> - View ban history<br>
+                    <code>/exportbans</code> - Download full ban history<br>
+                    <code>/backfillbans</code> - Import existing server bans<br>
+                    <code>/evidence</code> - Stored evidence for appeals<br>
+                    <code>/unban</code> - Unban a user in every server<br>
+                    <code>/accountreview</code> - Account review instructions<br>
+                    <code>/botperf</code> - Performance diagnostics (owners only)
                 </div>
             </div>
             
             <div class="footer">
                 <p>Discord Honeypot Protection System • Built with Discord.py</p>
-                <div class="refresh-timer">Dashboard updates every <strong>30 seconds</strong></div>
+                <div class="refresh-timer" id="stream-status">Connecting to live updates...</div>
             </div>
         </div>
         
         <script>
-            function updateTime() {{
+            function updateTime() {
                 const now = new Date();
-                const utc = now.toLocaleTimeString('en-US', {{ timeZone: 'UTC' }}) + ' UTC';
+                const utc = now.toLocaleTimeString('en-US', { timeZone: 'UTC' }) + ' UTC';
                 document.getElementById('current-time').textContent = utc;
-            }}
+            }
             updateTime();
             setInterval(updateTime, 1000);
-            
-            // Auto-refresh page every 30 seconds
-            setTimeout(function() {{
-                location.reload();
-            }}, 30000);
+
+            // Live numbers are pushed by the server; no page reloads needed
+            const streamStatus = document.getElementById('stream-status');
+            const source = new EventSource('/events');
+            source.onopen = function() {
+                streamStatus.textContent = 'Live updates connected';
+            };
+            source.onerror = function() {
+                if (source.readyState === EventSource.CLOSED) {
+                    // Refused (stream limit reached): poll instead
+                    streamStatus.textContent = 'Updating every __POLL__ seconds';
+                    const poll = function() {
+                        fetch('/api/stats').then(r => r.json())
+                            .then(data => render(data.live || {}))
+                            .catch(() => {});
+                    };
+                    poll();
+                    setInterval(poll, __POLL__ * 1000);
+                } else {
+                    streamStatus.textContent = 'Live updates disconnected, retrying...';
+                }
+            };
+            source.onmessage = function(event) {
+                render(JSON.parse(event.data));
+            };
+            function render(stats) {
+                document.getElementById('triggers-per-minute').textContent =
+                    stats.triggers_per_minute ?? '-';
+                document.getElementById('latency').textContent =
+                    stats.latency_ms != null ? stats.latency_ms + 'ms' : '-';
+                const queues = Object.entries(stats.queues || {})
+                    .map(([name, depth]) => name + ': ' + depth);
+                document.getElementById('queues').innerHTML = queues.join('<br>') || '-';
+                const bans = document.getElementById('recent-bans');
+                bans.replaceChildren();
+                for (const ban of stats.recent_bans || []) {
+                    const row = document.createElement('div');
+                    row.className = 'info';
+                    row.textContent = new Date(ban.at * 1000).toLocaleTimeString(
+                        'en-US', { timeZone: 'UTC' }) + ' UTC - ' +
+                        ban.indicators + ' indicator(s)' +
+                        (ban.top_indicator ? ' - ' + ban.top_indicator : '');
+                    bans.appendChild(row);
+                }
+                if (!bans.children.length) {
+                    bans.innerHTML = '<div class="info">No bans yet</div>';
+                }
+            }
         </script>
     </body>
     </html>
     """
 
+# The page is static; live numbers arrive over /events. Render and compress
+# it once instead of on every request. Each encoding gets its own strong ETag
+# since the bytes differ.
+DASHBOARD_BYTES = DASHBOARD_HTML.replace(
+    '__POLL__', str(SSE_POLL_INTERVAL)).encode('utf-8')
+DASHBOARD_GZIP = gzip.compress(DASHBOARD_BYTES, compresslevel=9)
+DASHBOARD_ETAG = hashlib.sha1(DASHBOARD_BYTES).hexdigest()[:16]
+DASHBOARD_GZIP_ETAG = DASHBOARD_ETAG + '-gz'
+_sse_slots = BoundedSemaphore(SSE_MAX_CLIENTS)
+
+# Latest stats published by the bot, serialized once per update and shared by
+# every open /events stream.
+_stats = {}
+_stats_payload = None
+_stats_version = 0
+_stats_changed = Condition()
+
+
+def publish_stats(stats):
+    """Called from the bot's event loop with a fresh stats dict"""
+    global _stats, _stats_payload, _stats_version
+    payload = json.dumps(stats, separators=(',', ':'))
+    with _stats_changed:
+        if payload == _stats_payload:
+            return
+        _stats = stats
+        _stats_payload = payload
+        _stats_version += 1
+        _stats_changed.notify_all()
+
+
+@app.route('/')
+def dashboard():
+    """Main dashboard page"""
+    use_gzip = 'gzip' in request.headers.get('Accept-Encoding', '')
+    etag = DASHBOARD_GZIP_ETAG if use_gzip else DASHBOARD_ETAG
+    headers = {
+        'ETag': f'"{etag}"',
+        'Cache-Control': 'no-cache',
+        'Vary': 'Accept-Encoding'
+    }
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+    if use_gzip:
+        headers['Content-Encoding'] = 'gzip'
+        body = DASHBOARD_GZIP
+    else:
+        body = DASHBOARD_BYTES
+    return Response(body, mimetype='text/html', headers=headers)
+
+
+@app.route('/events')
+def events():
+    """Server-Sent Events stream of live bot statistics"""
+    if not _sse_slots.acquire(blocking=False):
+        return Response("Too many live viewers", status=503,
+                        headers={'Retry-After': str(SSE_POLL_INTERVAL)})
+
+    def stream():
+        version = -1
+        deadline = time.monotonic() + SSE_MAX_AGE
+        yield "retry: 5000\n\n"
+        while time.monotonic() < deadline:
+            with _stats_changed:
+                _stats_changed.wait_for(lambda: _stats_version != version,
+                                        timeout=SSE_HEARTBEAT)
+                changed = _stats_version != version
+                version, payload = _stats_version, _stats_payload
+            if changed and payload:
+                yield f"data: {payload}\n\n"
+            else:
+                yield ": ping\n\n"
+
+    response = Response(stream(),
+                        mimetype='text/event-stream',
+                        headers={
+                            'Cache-Control': 'no-cache',
+                            'X-Accel-Buffering': 'no'
+                        })
+    # Runs on client disconnect too, even before the generator started
+    response.call_on_close(_sse_slots.release)
+    return response
+
 @app.route('/health')
 def health():
     """Health check endpoint - keeps bot alive"""
@@ -255,11 +420,13 @@ def api_stats():
         "status": "active",
         "bot_name": "HATSUNE MIKU HATE CLANKER",
         "service": "honeypot-protection",
-        "timestamp": time.time()
+        "timestamp": time.time(),
+        "live": _stats
     })
 
 def run():
-    app.run(host='0.0.0.0', port=5001, debug=False)
+    # Threaded so each open /events stream gets its own worker
+    app.run(host='0.0.0.0', port=5001, debug=False, threaded=True)
 
 def keep_alive():
     t = Thread(target=run)
@@ -0,0 +1,129 @@
+"""Scam-link and invite detection for message content.
+
+URLs and Discord invites are pulled out with precompiled regexes, and each
+host is checked against a blocklist held in a reversed-label suffix trie
+(blocking `scam.com` also blocks `login.scam.com`). The blocklist file is
+read once into the trie and reloaded when its mtime changes.
+
+Blocklist format: one domain per line; `#` comments, blank lines, hosts-file
+entries (`0.0.0.0 scam.com`) and `*.`/leading-dot prefixes are accepted.
+"""
+import os
+import re
+import sys
+
+URL_PATTERN = re.compile(
+    r'(?:https?://)?((?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z]{2,63})'
+    r'(?![a-z0-9-])', re.IGNORECASE)
+INVITE_PATTERN = re.compile(
+    r'(?:discord(?:app)?\.com/invite|discord\.(?:gg|io|me|li)|dsc\.gg)'
+    r'/([a-z0-9-]+)', re.IGNORECASE)
+
+# Stored in place of a child node once a domain is blocked: everything below
+# it is blocked too, so no deeper nodes are ever needed.
+_BLOCKED = True
+
+
+class DomainTrie:
+    """Suffix trie over reversed domain labels (com -> scam -> login).
+
+    Nodes are plain dicts keyed by interned labels; a blocked domain is a
+    `_BLOCKED` leaf rather than another dict, so the common case of 100k
+    second-level domains costs one dict entry each.
+    """
+
+    def __init__(self, domains=()):
+        self._root = {}
+        self.size = 0
+        for domain in domains:
+            self.add(domain)
+
+    def add(self, domain):
+        labels = domain.strip('.').lower().split('.')
+        if not labels or not all(labels):
+            return
+        node = self._root
+        for label in reversed(labels[1:]):
+            child = node.get(label)
+            if child is _BLOCKED:
+                return  # a parent domain is already blocked
+            if child is None:
+                child = node[label] = {}
+            node = child
+        if node.get(labels[0]) is not _BLOCKED:
+            node[sys.intern(labels[0])] = _BLOCKED
+            self.size += 1
+
+    def match(self, host):
+        """Return the blocked suffix of `host`, or None"""
+        node = self._root
+        labels = host.lower().rstrip('.').split('.')
+        for depth in range(len(labels) - 1, -1, -1):
+            node = node.get(labels[depth])
+            if node is _BLOCKED:
+                return '.'.join(labels[depth:])
+            if node is None:
+                return None
+        return None
+
+
+def parse_blocklist(lines):
+    for line in lines:
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        parts = line.split()
+        domain = parts[-1] if len(parts) > 1 else parts[0]
+        if domain.startswith('*.'):
+            domain = domain[2:]
+        yield sys.intern(domain.strip('.').lower())
+
+
+class Blocklist:
+    """A blocklist file loaded once into a DomainTrie, reloaded on change"""
+
+    def __init__(self, path):
+        self.path = path
+        self.trie = DomainTrie()
+        self._mtime = None
+
+    def reload_if_changed(self):
+        """Rebuild the trie if the file changed; returns True when reloaded.
+
+        Blocking file IO - run it off the event loop. The new trie is swapped
+        in with one assignment, so readers never see a half-built trie.
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return False
+        with open(self.path, encoding='utf-8', errors='ignore') as f:
+            trie = DomainTrie(parse_blocklist(f))
+        self.trie = trie
+        self._mtime = mtime
+        return True
+
+    def match(self, host):
+        return self.trie.match(host)
+
+
+def extract_hosts(content):
+    return {m.group(1).lower() for m in URL_PATTERN.finditer(content)}
+
+
+def extract_invites(content):
+    return [m.group(1) for m in INVITE_PATTERN.finditer(content)]
+
+
+def scan_message(content, blocklist):
+    """Return (blocked_domains, invite_codes) found in message content"""
+    if '.' not in content:
+        return [], []
+    blocked = []
+    for host in extract_hosts(content):
+        hit = blocklist.match(host)
+        if hit and hit not in blocked:
+            blocked.append(hit)
+    return blocked, extract_invites(content)
@@ -0,0 +1,117 @@
+"""Structured JSON logging that never blocks the event loop.
+
+Log calls only put the record on a bounded in-memory queue; a QueueListener
+thread formats it as one JSON line and writes it to stdout. When the queue
+is full (stdout stalled) records are dropped and counted instead of
+blocking the caller.
+
+Records carry optional `event`, `guild_id`, `user_id` and `duration` fields,
+passed with `extra=`. Environment knobs:
+
+    LOG_LEVEL    root level (default INFO)
+    LOG_LEVELS   per-logger levels, e.g. "bot=DEBUG,discord=WARNING"
+    LOG_SAMPLE   keep-rates for noisy events, e.g. "flood_detected=0.05"
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+
+FIELDS = ('event', 'guild_id', 'user_id', 'duration')
+QUEUE_SIZE = 10000
+DEFAULT_SAMPLE_RATES = {'flood_detected': 0.1}
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created))
+            + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for field in FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of records for configured high-volume events"""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        rate = self.rates.get(getattr(record, 'event', None))
+        return rate is None or random.random() < rate
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Only merge args into the message here; the JSON formatting happens
+        # on the listener thread.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _parse_pairs(value):
+    pairs = {}
+    for item in (value or '').split(','):
+        if '=' in item:
+            key, val = item.split('=', 1)
+            pairs[key.strip()] = val.strip()
+    return pairs
+
+
+def setup_logging():
+    """Install the queue handler on the root logger; returns the handler"""
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter())
+
+    handler = DroppingQueueHandler(queue.Queue(QUEUE_SIZE))
+    rates = dict(DEFAULT_SAMPLE_RATES)
+    for event, rate in _parse_pairs(os.getenv('LOG_SAMPLE')).items():
+        rates[event] = float(rate)
+    handler.addFilter(SamplingFilter(rates))
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    for name, level in _parse_pairs(os.getenv('LOG_LEVELS')).items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    listener = logging.handlers.QueueListener(handler.queue, stream)
+    listener.start()
+    atexit.register(listener.stop)
+    return handler
@@ -0,0 +1,124 @@
+"""Join-wave (raid) detection with time-bucketed counters.
+
+Each guild keeps a small ring of fixed-width time buckets counting joins and
+the account-age distribution of the joiners. Totals over the window are kept
+up to date as buckets rotate out, so every join is O(1) no matter how large
+the wave gets.
+"""
+import time
+
+# Account-age bins: <1 day, <7 days, <30 days, older
+AGE_BINS = (86400, 7 * 86400, 30 * 86400)
+AGE_LABELS = ("<1 day", "<7 days", "<30 days", "older")
+
+
+def age_bin(account_age_seconds):
+    for i, limit in enumerate(AGE_BINS):
+        if account_age_seconds < limit:
+            return i
+    return len(AGE_BINS)
+
+
+class JoinWave:
+    """Join counts over the last `buckets * bucket_seconds` seconds"""
+
+    def __init__(self, bucket_seconds=10, buckets=6):
+        self.bucket_seconds = bucket_seconds
+        self.buckets = buckets
+        self._counts = [[0] * len(AGE_LABELS) for _ in range(buckets)]
+        self._latest = None  # absolute index of the newest bucket
+        self.totals = [0] * len(AGE_LABELS)
+
+    def _advance(self, index):
+        if self._latest is None:
+            self._latest = index
+            return
+        # Clear every bucket between the newest one and now (at most `buckets`)
+        for stale in range(self._latest + 1,
+                           min(index, self._latest + self.buckets) + 1):
+            counts = self._counts[stale % self.buckets]
+            for i, count in enumerate(counts):
+                self.totals[i] -= count
+                counts[i] = 0
+        self._latest = max(self._latest, index)
+
+    def add(self, account_age_seconds, now):
+        self._advance(int(now // self.bucket_seconds))
+        i = age_bin(account_age_seconds)
+        self._counts[self._latest % self.buckets][i] += 1
+        self.totals[i] += 1
+
+    def snapshot(self, now):
+        self._advance(int(now // self.bucket_seconds))
+        return list(self.totals)
+
+
+class RaidMonitor:
+    """Per-guild join waves plus raid-mode state.
+
+    A guild enters raid mode when the window holds `join_threshold` joins,
+    or `young_threshold` joins from accounts under 7 days old (both can be
+    overridden per call to on_join). Raid mode lasts `duration` seconds
+    after the last join that was over a threshold.
+    """
+
+    def __init__(self,
+                 join_threshold=10,
+                 young_threshold=6,
+                 duration=300,
+                 bucket_seconds=10,
+                 buckets=6):
+        self.join_threshold = join_threshold
+        self.young_threshold = young_threshold
+        self.duration = duration
+        self.bucket_seconds = bucket_seconds
+        self.buckets = buckets
+        self._waves = {}
+        self._raid_until = {}
+
+    @property
+    def window(self):
+        return self.bucket_seconds * self.buckets
+
+    def on_join(self, guild_id, account_age_seconds, now=None,
+                join_threshold=None, young_threshold=None):
+        """Record a join. Returns True if this join started raid mode."""
+        now = time.monotonic() if now is None else now
+        join_threshold = join_threshold or self.join_threshold
+        young_threshold = young_threshold or self.young_threshold
+        wave = self._waves.get(guild_id)
+        if wave is None:
+            wave = self._waves[guild_id] = JoinWave(self.bucket_seconds,
+                                                    self.buckets)
+        wave.add(account_age_seconds, now)
+
+        totals = wave.totals
+        if sum(totals) < join_threshold and \
+                totals[0] + totals[1] < young_threshold:
+            return False
+        started = not self.in_raid(guild_id, now)
+        self._raid_until[guild_id] = now + self.duration
+        return started
+
+    def in_raid(self, guild_id, now=None):
+        until = self._raid_until.get(guild_id)
+        if until is None:
+            return False
+        now = time.monotonic() if now is None else now
+        return now < until
+
+    def expired(self, now=None):
+        """Pop and return guilds whose raid mode has run out"""
+        now = time.monotonic() if now is None else now
+        done = [g for g, until in self._raid_until.items() if now >= until]
+        for guild_id in done:
+            del self._raid_until[guild_id]
+        return done
+
+    def distribution(self, guild_id, now=None):
+        """{age label: joins in the window} for a guild"""
+        wave = self._waves.get(guild_id)
+        if wave is None:
+            return dict.fromkeys(AGE_LABELS, 0)
+        now = time.monotonic() if now is None else now
+        return dict(zip(AGE_LABELS, wave.snapshot(now)))
@@ -0,0 +1,175 @@
+"""Offline replay of recorded honeypot decisions through the detection rules.
+
+Records come from the bot's dry-run / RECORD_DECISIONS NDJSON log. Each line
+is re-evaluated with the current detection.py rules, spread across worker
+processes, and compared to labels to report precision/recall for every
+indicator-count threshold, plus throughput.
+
+Labels are taken from a `label` field on the record (true = bad actor), or
+from a separate NDJSON file of {"guild_id", "user_id", "label"} lines that
+takes precedence.
+
+    python replay.py decisions.ndjson --labels labels.ndjson --threshold 3
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+from multiprocessing import Pool
+
+import detection
+from linkscan import Blocklist
+
+MAX_THRESHOLD = 10
+
+_blocklist = None
+_labels = {}
+
+
+def _init_worker(blocklist_path, labels):
+    global _blocklist, _labels
+    _labels = labels
+    if blocklist_path:
+        _blocklist = Blocklist(blocklist_path)
+        _blocklist.reload_if_changed()
+
+
+def _label_for(record):
+    snapshot = record['snapshot']
+    label = _labels.get((snapshot['guild_id'], snapshot['user_id']))
+    return record.get('label') if label is None else label
+
+
+def evaluate_chunk(lines):
+    """Evaluate a chunk of NDJSON lines; returns partial counts to merge"""
+    # confusion[t] = [tp, fp, fn, tn] when predicting "bad" at >= t indicators
+    confusion = [[0, 0, 0, 0] for _ in range(MAX_THRESHOLD + 1)]
+    indicators_seen = Counter()
+    records = unlabelled = errors = 0
+    for line in lines:
+        try:
+            record = json.loads(line)
+            indicators = detection.evaluate(record['snapshot'], _blocklist)
+        except (ValueError, KeyError, TypeError):
+            errors += 1
+            continue
+        records += 1
+        for indicator in indicators:
+            indicators_seen[indicator.split(':', 1)[0]] += 1
+        label = _label_for(record)
+        if label is None:
+            unlabelled += 1
+            continue
+        for threshold, counts in enumerate(confusion):
+            predicted = len(indicators) >= threshold
+            if predicted:
+                counts[0 if label else 1] += 1
+            else:
+                counts[2 if label else 3] += 1
+    return records, unlabelled, errors, confusion, indicators_seen
+
+
+def read_chunks(path, chunk_size):
+    with open(path, encoding='utf-8') as f:
+        chunk = []
+        for line in f:
+            if line.strip():
+                chunk.append(line)
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+        if chunk:
+            yield chunk
+
+
+def load_labels(path):
+    labels = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                labels[(row['guild_id'], row['user_id'])] = bool(row['label'])
+    return labels
+
+
+def replay(path, labels=None, blocklist_path=None, workers=None,
+           chunk_size=5000):
+    """Replay a corpus; returns a summary dict"""
+    records = unlabelled = errors = 0
+    confusion = [[0, 0, 0, 0] for _ in range(MAX_THRESHOLD + 1)]
+    indicators_seen = Counter()
+    start = time.perf_counter()
+    with Pool(workers, initializer=_init_worker,
+              initargs=(blocklist_path, labels or {})) as pool:
+        for part in pool.imap_unordered(evaluate_chunk,
+                                        read_chunks(path, chunk_size)):
+            records += part[0]
+            unlabelled += part[1]
+            errors += part[2]
+            for total, counts in zip(confusion, part[3]):
+                for i, count in enumerate(counts):
+                    total[i] += count
+            indicators_seen.update(part[4])
+    elapsed = time.perf_counter() - start
+    return {
+        'records': records,
+        'unlabelled': unlabelled,
+        'errors': errors,
+        'seconds': elapsed,
+        'per_second': records / elapsed if elapsed else 0.0,
+        'confusion': confusion,
+        'indicators': indicators_seen,
+    }
+
+
+def precision_recall(tp, fp, fn):
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    return precision, recall
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('corpus', help="NDJSON decision log")
+    parser.add_argument('--labels', help="NDJSON file of guild_id/user_id/label")
+    parser.add_argument('--blocklist',
+                        default=os.path.join(os.path.dirname(
+                            os.path.abspath(__file__)), 'blocklist.txt'),
+                        help="domain blocklist for link rules")
+    parser.add_argument('--threshold', type=int, default=3,
+                        help="indicator count that counts as a ban")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    labels = load_labels(args.labels) if args.labels else None
+    summary = replay(args.corpus, labels, args.blocklist, args.workers,
+                     args.chunk_size)
+
+    print(f"Replayed {summary['records']:,} records in {summary['seconds']:.2f}s "
+          f"({summary['per_second']:,.0f} users/sec, {args.workers} workers)")
+    if summary['errors']:
+        print(f"Skipped {summary['errors']:,} malformed records")
+    labelled = summary['records'] - summary['unlabelled']
+    print(f"Labelled: {labelled:,}  Unlabelled: {summary['unlabelled']:,}")
+
+    if labelled:
+        print("\nthreshold  precision  recall     tp      fp      fn")
+        for threshold, (tp, fp, fn, _) in enumerate(summary['confusion']):
+            if threshold == 0:
+                continue
+            precision, recall = precision_recall(tp, fp, fn)
+            marker = '  <' if threshold == args.threshold else ''
+            print(f"{threshold:>9}  {precision:>9.3f}  {recall:>6.3f} "
+                  f"{tp:>6} {fp:>7} {fn:>7}{marker}")
+
+    print("\nMost common indicators:")
+    for name, count in summary['indicators'].most_common(10):
+        print(f"  {name}: {count:,}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
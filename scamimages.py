@@ -0,0 +1,145 @@
+"""Perceptual-hash index of known scam images.
+
+Image attachments posted into the honeypot are reduced to a 64-bit dHash
+and stored in an append-only file. In memory the hashes are kept in a
+multi-index hash table, so finding every known image within a few bits of
+a new one costs a handful of dict probes however many are stored.
+Hashing itself is done in a thread pool by the caller; Pillow releases the
+GIL while decoding and resizing.
+"""
+import io
+import os
+import threading
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow missing: image matching is disabled
+    Image = None
+
+HASHING_AVAILABLE = Image is not None
+
+HASH_SIZE = 8
+
+
+def dhash(data):
+    """64-bit difference hash of an encoded image (blocking - run in a pool)"""
+    with Image.open(io.BytesIO(data)) as img:
+        img.draft('L', (HASH_SIZE * 4, HASH_SIZE * 4))  # cheap JPEG downscale
+        small = img.convert('L').resize((HASH_SIZE + 1, HASH_SIZE),
+                                        Image.LANCZOS)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            left, right = pixels[offset + col], pixels[offset + col + 1]
+            value = value << 1 | (left > right)
+    return value
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+class MultiIndexHash:
+    """Multi-index hashing over 64-bit hashes for Hamming-radius queries.
+
+    Each hash is split into BANDS 16-bit substrings with one dict per band.
+    If two hashes differ in at most r bits, some band differs in at most
+    r // BANDS bits, so a query only probes those few neighbouring keys per
+    band and verifies the candidates - independent of how many hashes are
+    stored. (A BK-tree degrades to a near-full scan for random 64-bit
+    hashes at useful radii.)
+    """
+
+    BANDS = 4
+    BAND_BITS = 64 // BANDS
+    _BAND_MASK = (1 << BAND_BITS) - 1
+
+    def __init__(self):
+        self._tables = [{} for _ in range(self.BANDS)]
+        self._hashes = set()
+        self._probes = {0: [0]}
+
+    @property
+    def size(self):
+        return len(self._hashes)
+
+    def _bands(self, value):
+        for band in range(self.BANDS):
+            yield band, value >> (band * self.BAND_BITS) & self._BAND_MASK
+
+    def _flip_masks(self, bits):
+        """Every BAND_BITS-wide mask with at most `bits` bits set"""
+        masks = self._probes.get(bits)
+        if masks is None:
+            masks = [0]
+            for _ in range(bits):
+                masks = list({
+                    mask | 1 << bit
+                    for mask in masks for bit in range(self.BAND_BITS)
+                })
+            masks = self._probes[bits] = sorted(
+                set(masks) | set(self._flip_masks(bits - 1)))
+        return masks
+
+    def add(self, value):
+        if value in self._hashes:
+            return False
+        self._hashes.add(value)
+        for band, key in self._bands(value):
+            self._tables[band].setdefault(key, []).append(value)
+        return True
+
+    def query(self, value, radius):
+        """Return [(distance, hash)] for every stored hash within `radius`"""
+        masks = self._flip_masks(radius // self.BANDS)
+        seen = set()
+        results = []
+        for band, key in self._bands(value):
+            table = self._tables[band]
+            for mask in masks:
+                for stored in table.get(key ^ mask, ()):
+                    if stored in seen:
+                        continue
+                    seen.add(stored)
+                    distance = hamming(value, stored)
+                    if distance <= radius:
+                        results.append((distance, stored))
+        results.sort()
+        return results
+
+
+class ScamImageIndex:
+    """MultiIndexHash backed by an append-only file of hex hashes"""
+
+    def __init__(self, path):
+        self.path = path
+        self.hashes = MultiIndexHash()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.hashes.size
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    self.hashes.add(int(line, 16))
+        return self.hashes.size
+
+    def add(self, value):
+        """Add a hash and persist it (blocking file IO - run it in a pool)"""
+        with self._lock:
+            if not self.hashes.add(value):
+                return False
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(f"{value:016x}\n")
+        return True
+
+    def nearest(self, value, radius):
+        matches = self.hashes.query(value, radius)
+        return matches[0] if matches else None
@@ -0,0 +1,131 @@
+-- Supabase schema for the honeypot bot.
+-- Run in the Supabase SQL editor; every statement is safe to re-run.
+
+create table if not exists guild_configs (
+    guild_id bigint primary key,
+    honeypot_channel_id bigint,
+    log_channel_id bigint,
+    ban_reason text default 'Automatic ban: Suspected compromised account/bot'
+);
+
+create table if not exists ban_history (
+    id bigserial primary key,
+    guild_id bigint not null,
+    banned_user_id bigint not null,
+    banned_username text,
+    ban_reason text,
+    indicators text,
+    banned_at timestamptz not null default now()
+);
+
+-- Per-guild daily rollups maintained incrementally by the bot (/honeypotstats)
+create table if not exists guild_daily_stats (
+    guild_id bigint not null,
+    day date not null,
+    triggers integer not null default 0,
+    bans integer not null default 0,
+    failed_bans integer not null default 0,
+    indicators jsonb not null default '{}'::jsonb,
+    primary key (guild_id, day)
+);
+
+-- Bans imported from Discord by /backfillbans (ban time unknown, so banned_at
+-- is the import time)
+alter table ban_history add column if not exists backfilled boolean not null default false;
+
+create table if not exists ban_backfill_progress (
+    guild_id bigint primary key,
+    last_user_id bigint,
+    backfilled integer not null default 0,
+    completed boolean not null default false,
+    updated_at timestamptz not null default now()
+);
+
+-- Retention: /banhistory reads a guild's newest rows, so index that order.
+-- Rows older than the guild's retention_days (bot default when null, 0 keeps
+-- everything) are moved to ban_history_archive by the bot's retention job.
+create index if not exists ban_history_guild_banned_at
+    on ban_history (guild_id, banned_at desc, id desc);
+
+-- /banhistory hides backfilled rows. They all carry the import time, newer
+-- than every real ban, so the index above would walk past all of them first.
+create index if not exists ban_history_guild_banned_at_not_backfilled
+    on ban_history (guild_id, banned_at desc, id desc) where not backfilled;
+
+alter table guild_configs add column if not exists retention_days integer;
+
+create table if not exists ban_history_archive (
+    id bigint primary key,
+    guild_id bigint not null,
+    banned_user_id bigint not null,
+    banned_username text,
+    ban_reason text,
+    indicators text,
+    banned_at timestamptz not null,
+    backfilled boolean not null default false,
+    archived_at timestamptz not null default now()
+);
+
+create index if not exists ban_history_archive_guild_banned_at
+    on ban_history_archive (guild_id, banned_at desc);
+
+-- Move up to p_limit of a guild's rows older than p_before into the archive;
+-- returns how many moved. Called repeatedly until it returns < p_limit.
+create or replace function archive_ban_history(p_guild_id bigint,
+                                               p_before timestamptz,
+                                               p_limit integer default 1000)
+returns integer
+language sql
+as $$
+    with expired as (
+        select id from ban_history
+        where guild_id = p_guild_id and banned_at < p_before
+        order by banned_at, id
+        limit p_limit
+        for update skip locked
+    ), moved as (
+        delete from ban_history h
+        using expired e
+        where h.id = e.id
+        returning h.id, h.guild_id, h.banned_user_id, h.banned_username,
+                  h.ban_reason, h.indicators, h.banned_at, h.backfilled
+    ), archived as (
+        insert into ban_history_archive (id, guild_id, banned_user_id,
+                                         banned_username, ban_reason,
+                                         indicators, banned_at, backfilled)
+        select * from moved
+        on conflict (id) do nothing
+    )
+    select count(*)::integer from moved;
+$$;
+
+-- Config writes send only the changed columns. `version` is bumped by the
+-- trigger on every update, so a PATCH filtered on version=eq.N is a
+-- compare-and-swap: it matches no row if someone else wrote first.
+alter table guild_configs add column if not exists version integer not null default 1;
+
+create or replace function bump_guild_config_version()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.version := old.version + 1;
+    return new;
+end;
+$$;
+
+drop trigger if exists guild_configs_version on guild_configs;
+create trigger guild_configs_version
+    before update on guild_configs
+    for each row execute function bump_guild_config_version();
+
+-- /backfillbans skips users that already have a ban row for the guild
+create index if not exists ban_history_guild_user
+    on ban_history (guild_id, banned_user_id);
+create index if not exists ban_history_archive_guild_user
+    on ban_history_archive (guild_id, banned_user_id);
+
+-- Per-guild raid thresholds set with /setraid (bot defaults when null)
+alter table guild_configs add column if not exists raid_join_threshold integer;
+alter table guild_configs add column if not exists raid_young_threshold integer;
+alter table guild_configs add column if not exists raid_ban_threshold integer;
@@ -0,0 +1,115 @@
+"""Supervised background work with bounded concurrency and backpressure.
+
+Post-ban work (log embeds, ban_history writes, message cleanup) used to be
+fire-and-forget tasks: nothing held a reference, exceptions vanished and a
+raid could pile up any number of them. Here every job goes through one
+bounded priority queue drained by a fixed set of workers:
+
+* HIGH jobs (database writes, cleanup) wait for room - backpressure on the
+  caller rather than unbounded growth.
+* LOW jobs (log-channel embeds) are shed when the queue is past half full,
+  so they can never crowd out HIGH work.
+* Exceptions are logged and counted per type.
+* drain() stops intake and waits for queued jobs before shutdown.
+"""
+import asyncio
+import itertools
+import logging
+from collections import Counter
+
+log = logging.getLogger('supervisor')
+
+HIGH = 0
+LOW = 1
+
+
+class TaskSupervisor:
+
+    def __init__(self, workers=4, queue_size=200):
+        self.worker_count = workers
+        self.queue_size = queue_size
+        self._queue = None
+        self._workers = []
+        self._seq = itertools.count()
+        self._accepting = True
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.shed = 0
+        self.errors = Counter()
+
+    @property
+    def pending(self):
+        return self._queue.qsize() if self._queue else 0
+
+    def start(self):
+        if self._workers:
+            return
+        self._queue = asyncio.PriorityQueue(self.queue_size)
+        self._accepting = True
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"supervisor-worker-{i}")
+            for i in range(self.worker_count)
+        ]
+
+    async def submit(self, coro, priority=HIGH, name=None):
+        """Queue a coroutine. Returns False if it was shed instead."""
+        name = name or getattr(coro, '__qualname__', 'job')
+        if not self._accepting or self._queue is None or (
+                priority == LOW and self.pending >= self.queue_size // 2):
+            coro.close()
+            self.shed += 1
+            log.warning("Shed background job %s", name,
+                        extra={'event': 'job_shed'})
+            return False
+        await self._queue.put((priority, next(self._seq), name, coro))
+        return True
+
+    async def _worker(self):
+        while True:
+            _, _, name, coro = await self._queue.get()
+            self.running += 1
+            try:
+                await coro
+                self.completed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                self.errors[type(e).__name__] += 1
+                log.exception("Background job %s failed", name,
+                              extra={'event': 'job_failed'})
+            finally:
+                self.running -= 1
+                self._queue.task_done()
+
+    async def drain(self, timeout=30):
+        """Stop accepting jobs, wait for queued ones, then stop the workers"""
+        if not self._workers:
+            return True
+        self._accepting = False
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+            drained = True
+        except asyncio.TimeoutError:
+            drained = False
+            log.warning("Shutdown with %d background job(s) unfinished",
+                        self.pending + self.running,
+                        extra={'event': 'drain_timeout'})
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        while not self._queue.empty():
+            self._queue.get_nowait()[3].close()
+            self._queue.task_done()
+        return drained
+
+    def stats(self):
+        return {
+            'queued': self.pending,
+            'running': self.running,
+            'completed': self.completed,
+            'failed': self.failed,
+            'shed': self.shed,
+        }